@@ -1,144 +1,304 @@
 '''
 ## Чтение и проверка данных АЦП с SD карты
 '''
-from crccheck.crc import Crc32Mpeg2
+import os
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-import fattime
+import numpy as np
+import crc32_mpeg2, sd_index, sd_reader, time_sequence
 
 # Настройки программы
 ADC_SAMPLE_NUMBER = 2048 # Кол-во отсчетов АЦП в двухсекундном интервале
 ADC_FRAME_START = 0 # Начальный фрейм для анализа данных (можно начинать анализ с середины файла)
 ADC_FRAME_NUMBER = 1800 # Кол-во двухсекундных фреймов (интервалов) в одном файле данных
 ADC_DATA_WIDTH = 4 # Разрядность данных АЦП
-CHECK_CRC = True # Выполнять проверку CRC каждого фрейма или нет (существенно влияет на время выполнения программы)
+ADC_RESOLUTION = 2**23 # [bits], half of the range, positive values
+ADC_RANGE = 10000 # [mV]
+ADC_SCALE = ADC_RANGE / ADC_RESOLUTION
+CHECK_CRC = True # Выполнять проверку CRC каждого фрейма или нет
 CHECK_TIME = True # Выполнять проверку временных меток каждого фрейма или нет
+PARALLEL_CHANNELS = True # Обрабатывать файлы каналов параллельно, в отдельных процессах
+USE_INDEX_CACHE = True # Сохранять результаты проверки фреймов в индексный файл и использовать их при повторном чтении
+ADC_CHUNK_FRAMES = 150 # Кол-во фреймов в одной порции при потоковом чтении (5 минут)
+ADC_FRAME_SIZE = 4 + ADC_SAMPLE_NUMBER * ADC_DATA_WIDTH + 4 # Размер фрейма в файле: метка времени, данные АЦП, CRC
+
+# Структура фрейма данных АЦП в файле. Отсчет АЦП хранится в трех старших байтах 32-битного слова
+adc_frame_dtype = np.dtype([
+	('time', '<u4'),                          # Временная метка в формате FAT_TIME
+	('data', '<i4', (ADC_SAMPLE_NUMBER,)),    # Отсчеты АЦП
+	('crc', '<u4'),                           # CRC32-MPEG2 фрейма, записанная в файл
+])
+
+ADC_FILENAMES = ['CH0.DAT', 'CH1.DAT', 'CH2.DAT']
 
 elapsedTime = 0
 
-all_data_int = [
-	[], [], []
-]
-
-date_time_max = {
-	'sec': 58,
-	'min': 59,
-	'hour': 23,
-}
-
-def adc_frame_analysis_fast(input_file, channel_index):
-	'''
-	Brief Преобразование данных АЦП и проверка контрольной суммы \n
-	Param[in] *input_file* файл для чтения данных \n
-	Param[in] *channel_index* индекс канала АЦП \n
-	Return Вычисленное значение CRC \n
-	'''
-	# Вычисление CRC по данным АЦП, с измением порядка байт
-	adc_data = bytearray(input_file.read(ADC_SAMPLE_NUMBER * ADC_DATA_WIDTH))
-	for sample_idx in range(0, ADC_SAMPLE_NUMBER):
-		sample_data = []
-		for byte_idx in range(4):
-			sample_data.append(adc_data[(sample_idx * ADC_DATA_WIDTH) + (3 - byte_idx)])
-		sample_value = 0
-		for byte_idx in range(4):
-			adc_data[(sample_idx * ADC_DATA_WIDTH) + byte_idx] =  sample_data[byte_idx]
-		for byte_idx in range(3):
-			sample_value = sample_value + (sample_data[byte_idx] << ((2-byte_idx) * 8))
-		if sample_value >= 0x800000:
-			sample_value = (0x1000000 - sample_value)*(-1)
-		all_data_int[channel_index].append(sample_value)
+def adc_file_open(file_name):
+	'''
+	Brief Открытие файла данных АЦП для произвольного доступа к фреймам по номеру \n
+	Param[in] *file_name* имя файла данных АЦП \n
+	Return Объект sd_reader.FrameReader, фреймы со структурой adc_frame_dtype \n
+	'''
+	return sd_reader.FrameReader(file_name, adc_frame_dtype)
+
+def adc_frames_find(file_name, time_start, time_stop):
+	'''
+	Brief Поиск фреймов файла данных АЦП в интервале времени (двоичный поиск по заголовкам фреймов) \n
+	Param[in] *file_name* имя файла данных канала АЦП \n
+	Param[in] *time_start* начало интервала: FAT_TIME или datetime \n
+	Param[in] *time_stop* конец интервала (включительно): FAT_TIME или datetime \n
+	Return Словарь: номер первого фрейма, кол-во фреймов, пропуски данных (см. sd_reader.FrameReader.find_time_range) \n
+	'''
+	with adc_file_open(file_name) as adc_file:
+		return adc_file.find_time_range(time_start, time_stop)
+
+def adc_frames_decode(adc_frames):
+	'''
+	Brief Преобразование данных АЦП всех фреймов: выделение 24-битного отсчета и расширение знака \n
+	Param[in] *adc_frames* массив фреймов со структурой adc_frame_dtype \n
+	Return Массив отсчетов АЦП int32, ADC_SAMPLE_NUMBER отсчетов на каждый фрейм \n
+	'''
+	# Арифметический сдвиг знакового слова выделяет старшие 24 бита и сохраняет знак
+	return (adc_frames['data'] >> 8).reshape(-1)
+
+def adc_frames_crc_check(adc_frames):
+	'''
+	Brief Проверка CRC всех фреймов данных АЦП за один вызов (CRC по данным с измененным порядком байт) \n
+	Param[in] *adc_frames* массив фреймов со структурой adc_frame_dtype \n
+	Return Список номеров фреймов с ошибкой CRC \n
+	'''
+	return crc32_mpeg2.check_frames(adc_frames['data'], adc_frames['crc'])
+
+def adc_samples_to_mv(samples):
+	'''
+	Brief Преобразование отсчетов АЦП в физическую величину \n
+	Param[in] *samples* массив отсчетов АЦП int32 \n
+	Return Массив значений напряжения float32, [mV] \n
+	'''
+	return np.multiply(samples, ADC_SCALE, dtype=np.float32)
+
+def adc_chunk_create(adc_frame_start, adc_frames):
+	'''
+	Brief Преобразование и проверка CRC порции фреймов данных АЦП \n
+	Param[in] *adc_frame_start* номер первого фрейма порции \n
+	Param[in] *adc_frames* массив фреймов со структурой adc_frame_dtype \n
+	Return Словарь: номер первого фрейма порции, метки времени FAT_TIME, \n
+	отсчеты АЦП int32 (ADC_SAMPLE_NUMBER на фрейм), статус CRC каждого фрейма \n
+	'''
 	if True == CHECK_CRC:
-		return Crc32Mpeg2.calc(adc_data)
+		crc_ok = crc32_mpeg2.calc_words(adc_frames['data']) == adc_frames['crc']
 	else:
-		return 0
+		crc_ok = np.ones(len(adc_frames), dtype=bool)
+	return {
+		'frame_idx': adc_frame_start,
+		'frame_time': adc_frames['time'].copy(),
+		'samples': adc_frames_decode(adc_frames),
+		'crc_ok': crc_ok,
+	}
 
-def check_time_sequence(time_current, time_last):
+def adc_frames_iter(file_name, adc_frame_start=0, adc_frame_count=None, chunk_frames=ADC_CHUNK_FRAMES):
 	'''
-	Brief Проверка последовательности временных меток \n
-	Param[in] *time_current* текущая временная метка \n
-	Param[in] *time_last* прошлая временная метка \n
-	Return Статус ошибки \n
+	Brief Потоковое чтение файла данных АЦП порциями фреймов, объем памяти ограничен размером порции \n
+	Param[in] *file_name* имя файла данных канала АЦП \n
+	Param[in] *adc_frame_start* номер фрейма данных, с которого начинается чтение \n
+	Param[in] *adc_frame_count* количество фреймов данных (None - до конца файла) \n
+	Param[in] *chunk_frames* количество фреймов в одной порции \n
+	Return Генератор словарей: номер первого фрейма порции, метки времени FAT_TIME, \n
+	отсчеты АЦП int32 (ADC_SAMPLE_NUMBER на фрейм), статус CRC каждого фрейма \n
 	'''
-	min_decrement = False
-	sequence_error = False
-	last_frame_time_calc = {
-		'sec': 0,
-		'min': 0,
-	}
+	with adc_file_open(file_name) as adc_file:
+		adc_frames = adc_file.frames(adc_frame_start, adc_frame_count)
+		for chunk_start in range(0, len(adc_frames), chunk_frames):
+			chunk_frames_data = adc_frames[chunk_start:chunk_start + chunk_frames]
+			adc_chunk = adc_chunk_create(adc_frame_start + chunk_start, chunk_frames_data)
+			del chunk_frames_data
+			yield adc_chunk
+		del adc_frames
 
-	if (0 == time_current['sec']):
-		last_frame_time_calc['sec'] = date_time_max['sec']
-		min_decrement = True
-	else:
-		last_frame_time_calc['sec'] = time_current['sec'] - 2
-	if True == min_decrement:
-		if (0 == time_current['min']):
-			last_frame_time_calc['min'] = date_time_max['min']
+def adc_frames_follow(file_name, chunk_process, adc_frame_start=0, poll_interval=sd_reader.FOLLOW_POLL_INTERVAL, idle_timeout=None, stop_event=None):
+	'''
+	Brief Чтение файла данных АЦП, в который еще идет запись: преобразуются и проверяются только новые полные фреймы \n
+	Param[in] *file_name* имя файла данных канала АЦП \n
+	Param[in] *chunk_process* функция обработки порции данных (например, queue.Queue.put), \n
+	порция - словарь как у adc_frames_iter и номера фреймов с ошибкой времени 'time_err_frames' \n
+	Param[in] *adc_frame_start* номер фрейма, с которого начинается чтение \n
+	Param[in] *poll_interval* интервал опроса размера файла, [s] \n
+	Param[in] *idle_timeout* остановка, если файл не растет заданное время, [s] (None - без ограничения) \n
+	Param[in] *stop_event* объект threading.Event для остановки из другого потока \n
+	Return Количество прочитанных фреймов (номер фрейма для продолжения чтения) \n
+	'''
+	previous_time = [None]
+
+	def frames_process(frame_start, adc_frames):
+		if 0 == frame_start:
+			previous_time[0] = None # Файл начат заново: метки новой записи не сравниваются с предыдущей
+		adc_chunk = adc_chunk_create(frame_start, adc_frames)
+		# Метка первого нового фрейма сравнивается с меткой последнего фрейма предыдущей порции
+		if True == CHECK_TIME:
+			adc_chunk['time_err_frames'] = [frame_start + frame_idx for frame_idx in
+				time_sequence.check_time_continuation(adc_chunk['frame_time'], previous_time[0])]
 		else:
-			last_frame_time_calc['min'] = time_current['min'] - 1
+			adc_chunk['time_err_frames'] = []
+		previous_time[0] = adc_chunk['frame_time'][-1]
+		chunk_process(adc_chunk)
+
+	adc_follower = sd_reader.FrameFollower(file_name, adc_frame_dtype, adc_frame_start)
+	return adc_follower.follow(frames_process, poll_interval, idle_timeout, stop_event)
+
+def adc_index_build(file_name):
+	'''
+	Brief Проверка всех фреймов файла данных АЦП для построения индекса \n
+	Param[in] *file_name* имя файла данных канала АЦП \n
+	Return Словарь массивов индекса (см. sd_index) \n
+	'''
+	with adc_file_open(file_name) as adc_file:
+		adc_frames = adc_file.frames()
+		frame_time = adc_frames['time'].copy()
+		crc_file = adc_frames['crc'].copy()
+		crc_calc = crc32_mpeg2.calc_words(adc_frames['data'])
+		del adc_frames
+	time_ok = np.ones(len(frame_time), dtype=bool)
+	time_ok[time_sequence.check_time_sequence(frame_time)['err_frames']] = False
+	return sd_index.index_create(ADC_FRAME_SIZE, frame_time, crc_file, crc_calc, time_ok)
+
+def adc_channel_analysis(file_name, adc_frame_start, adc_frame_count):
+	'''
+	Brief Чтение, преобразование и проверка данных одного канала АЦП (может выполняться в отдельном процессе) \n
+	Param[in] *file_name* имя файла данных канала АЦП \n
+	Param[in] *adc_frame_start* номер фрейма данных, с которого начинается чтение \n
+	Param[in] *adc_frame_count* количество фреймов данных, которые нужно прочитать \n
+	Return Словарь с отсчетами АЦП канала и результатами проверки CRC и временных меток \n
+	> При USE_INDEX_CACHE = True результаты проверки берутся из индексного файла, если файл данных не изменился \n
+	'''
+	channel_report = {
+		'samples': None,
+		'crc_ok': True,
+		'crc_err_frames': [],
+		'time_sequence': True,
+		'time_sequence_err_frames': [],
+	}
+	adc_file = adc_file_open(file_name)
+	# Фреймы с adc_frame_start: отображаются в память только нужные страницы файла
+	adc_frames = adc_file.frames(adc_frame_start, adc_frame_count)
+	channel_report['samples'] = adc_frames_decode(adc_frames)
+	if True == USE_INDEX_CACHE and True == CHECK_CRC and True == CHECK_TIME:
+		frame_index = sd_index.index_get(file_name, adc_index_build)
+		channel_report['crc_err_frames'], channel_report['time_sequence_err_frames'] = \
+			sd_index.index_errors(frame_index, adc_frame_start, len(adc_frames))
+	else:
+		if True == CHECK_CRC:
+			channel_report['crc_err_frames'] = adc_frames_crc_check(adc_frames)
+		# Проверка последовательности временных меток
+		if True == CHECK_TIME:
+			channel_report['time_sequence_err_frames'] = time_sequence.check_time_sequence(adc_frames['time'])['err_frames']
+	if True == CHECK_CRC:
+		channel_report['crc_ok'] = 0 == len(channel_report['crc_err_frames'])
 	else:
-		last_frame_time_calc['min'] = time_current['min']
-	if (last_frame_time_calc['sec'] != time_last['sec']) or \
-		(last_frame_time_calc['min'] != time_last['min']):
-		sequence_error = True
-	return sequence_error
+		channel_report['crc_ok'] = 'Not tested'
+	if True == CHECK_TIME:
+		channel_report['time_sequence'] = 0 == len(channel_report['time_sequence_err_frames'])
+	else:
+		channel_report['time_sequence'] = 'Not tested'
+	del adc_frames
+	adc_file.close()
+	return channel_report
+
+class AdcParseSession(object):
+	'''
+	Brief Сеанс разбора данных АЦП. Хранит результаты только своего разбора, \n
+	поэтому повторные вызовы не накапливают данные предыдущих \n
+	'''
+	def __init__(self, adc_filenames=ADC_FILENAMES):
+		'''
+		Brief Создание сеанса разбора \n
+		Param[in] *adc_filenames* имена файлов данных каналов АЦП \n
+		'''
+		self.adc_filenames = list(adc_filenames)
+		self.channel_reports = []
+		self.crc_err_frames = []
+		self.time_err_frames = []
+		self.elapsed_time = 0
+
+	def iter_frames(self, channel_idx, adc_frame_start=0, adc_frame_count=None, chunk_frames=ADC_CHUNK_FRAMES):
+		'''
+		Brief Потоковое чтение данных одного канала порциями фреймов (см. adc_frames_iter) \n
+		Param[in] *channel_idx* индекс канала АЦП \n
+		Param[in] *adc_frame_start* номер фрейма данных, с которого начинается чтение \n
+		Param[in] *adc_frame_count* количество фреймов данных (None - до конца файла) \n
+		Param[in] *chunk_frames* количество фреймов в одной порции \n
+		Return Генератор порций данных \n
+		'''
+		return adc_frames_iter(self.adc_filenames[channel_idx], adc_frame_start, adc_frame_count, chunk_frames)
+
+	def iter_channels(self, adc_frame_start=0, adc_frame_count=None, chunk_frames=ADC_CHUNK_FRAMES):
+		'''
+		Brief Потоковое чтение данных всех каналов одновременно, порциями с одинаковым диапазоном фреймов. \n
+		Номера фреймов с ошибкой CRC и времени собираются в self.crc_err_frames и self.time_err_frames \n
+		(список на каждый канал, номера относительно adc_frame_start, как в analysis), последовательность меток \n
+		проверяется и на границах порций \n
+		Param[in] *adc_frame_start* номер фрейма данных, с которого начинается чтение \n
+		Param[in] *adc_frame_count* количество фреймов данных (None - до конца файла) \n
+		Param[in] *chunk_frames* количество фреймов в одной порции \n
+		Return Генератор списков порций данных, по одной порции на канал \n
+		'''
+		self.crc_err_frames = [[] for channel_idx in range(len(self.adc_filenames))]
+		self.time_err_frames = [[] for channel_idx in range(len(self.adc_filenames))]
+		previous_time = [None] * len(self.adc_filenames)
+		channel_iters = [self.iter_frames(channel_idx, adc_frame_start, adc_frame_count, chunk_frames) for channel_idx in range(len(self.adc_filenames))]
+		for channel_chunks in zip(*channel_iters):
+			for channel_idx, channel_chunk in enumerate(channel_chunks):
+				self.crc_err_frames[channel_idx].extend((channel_chunk['frame_idx'] - adc_frame_start + np.flatnonzero(~channel_chunk['crc_ok'])).tolist())
+				if True == CHECK_TIME and len(channel_chunk['frame_time']) > 0:
+					self.time_err_frames[channel_idx].extend([channel_chunk['frame_idx'] - adc_frame_start + frame_idx for frame_idx in
+						time_sequence.check_time_continuation(channel_chunk['frame_time'], previous_time[channel_idx])])
+					previous_time[channel_idx] = channel_chunk['frame_time'][-1]
+			yield channel_chunks
+
+	def analysis(self, adc_frame_start, adc_frame_count):
+		'''
+		Brief Чтение и проверка данных всех каналов \n
+		Param[in] *adc_frame_start* номер фрейма данных, с которого начинается чтение \n
+		Param[in] *adc_frame_count* количество фреймов данных, которые нужно прочитать \n
+		Return Список массивов отсчетов АЦП int32, по одному на канал \n
+		> При PARALLEL_CHANNELS = True файлы каналов обрабатываются одновременно в пуле процессов \n
+		'''
+		channel_count = len(self.adc_filenames)
+		start_datetime = datetime.now()
+		# Каналы независимы: каждый файл читается и проверяется отдельно
+		if True == PARALLEL_CHANNELS:
+			with ProcessPoolExecutor(max_workers=channel_count) as executor:
+				self.channel_reports = list(executor.map(adc_channel_analysis, self.adc_filenames,
+					[adc_frame_start] * channel_count, [adc_frame_count] * channel_count))
+		else:
+			self.channel_reports = [adc_channel_analysis(file_name, adc_frame_start, adc_frame_count) for file_name in self.adc_filenames]
+		# Объединение результатов всех каналов
+		all_data_int = []
+		for file_idx in range(channel_count):
+			all_data_int.append(self.channel_reports[file_idx]['samples'])
+			print('Channel = ', file_idx, ':: crc_ok = ', self.channel_reports[file_idx]['crc_ok'], ':: time_sequence = ', self.channel_reports[file_idx]['time_sequence'])
+			print('crc_err idx: ', self.channel_reports[file_idx]['crc_err_frames'], ':: time_err idx: ', self.channel_reports[file_idx]['time_sequence_err_frames'])
+		finish_datetime = datetime.now()
+		self.elapsed_time = finish_datetime - start_datetime
+		print('>__ Data analysis time is ' + str(self.elapsed_time))
+		return all_data_int
 
-def main(adc_frame_start, adc_frame_count):
+def main(adc_frame_start, adc_frame_count, data_dir='.'):
 	''' #MAIN \n
 	Brief  Чтение бинарных данных АЦП всех каналов измерения за один час \n
 	Param[in] *adc_frame_start* номер фрейма данных, с которого начинается чтение \n
 	Param[in] *adc_frame_count* количество фреймов данных, которые нужно прочитать \n
-	Return [[], [], []] Список данных АЦП для каждого из каналов, макс. 2048*1800 чисел для одного канала \n
+	Param[in] *data_dir* каталог с файлами данных сеанса записи \n
+	Return Список массивов отсчетов АЦП int32 для каждого из каналов, макс. 2048*1800 чисел для одного канала \n
+	(физические значения: adc_samples_to_mv) \n
 	Return *elapsedTime* Значения затраченного времени
 	> Диапазон значений отсчета АЦП: {-2^23...+2^23-1} \n
 	'''
-	ADC_FILENAMES = ['CH0.DAT', 'CH1.DAT', 'CH2.DAT']
-	adc_files = []
 	if adc_frame_count > ADC_FRAME_NUMBER:
 		adc_frame_count = ADC_FRAME_NUMBER
-	start_datetime = datetime.now()
-	# Открыть бинарный файл для чтения
-	for file_idx in range(3):
-		adc_files.append(open(ADC_FILENAMES[file_idx], 'rb'))
-		
-		adc_frame_descr = {
-			'frame_time': [],
-			'crc_calc': [],
-			'crc_file': [],
-		}
-		crc_ok = True
-		crc_err_frames = []
-		time_sequence = True
-		time_sequence_err_frames = []
-		# Если нужно читать данные не сначала
-		if 	adc_frame_start > 0:
-			adc_files[file_idx].seek((4 + ADC_SAMPLE_NUMBER * ADC_DATA_WIDTH + 4) * adc_frame_start)
-		for frame_idx in range(adc_frame_count):
-			adc_frame_descr['frame_time'].append( fattime.convert_from_fattime(adc_files[file_idx].read(4)) )
-			adc_frame_descr['crc_calc'].append( adc_frame_analysis_fast(adc_files[file_idx], file_idx) )
-			adc_frame_descr['crc_file'].append( int.from_bytes(adc_files[file_idx].read(4), byteorder = 'little', signed = False) )
-			if (adc_frame_descr['crc_calc'][frame_idx] != adc_frame_descr['crc_file'][frame_idx]):
-				if True == CHECK_CRC:
-					crc_ok = False
-					crc_err_frames.append(frame_idx)
-				else:
-					crc_ok = 'Not tested'
-			# Проверка последовательности временных меток
-			if True == CHECK_TIME:
-				if (frame_idx > 0) and (True == check_time_sequence(adc_frame_descr['frame_time'][frame_idx], adc_frame_descr['frame_time'][frame_idx - 1])):
-					time_sequence = False
-					time_sequence_err_frames.append(frame_idx)
-			else:
-				time_sequence = 'Not tested'
-
-		print('Channel = ', file_idx, ':: crc_ok = ', crc_ok, ':: time_sequence = ', time_sequence)
-		print('crc_err idx: ', crc_err_frames, ':: time_err idx: ', time_sequence_err_frames)
-		adc_files[file_idx].close()
-	
-	finish_datetime = datetime.now()
-	elapsedTime = finish_datetime - start_datetime
-	print('>__ Data analysis time is ' + str(finish_datetime - start_datetime))
-	return all_data_int, elapsedTime
+	adc_session = AdcParseSession([os.path.join(data_dir, file_name) for file_name in ADC_FILENAMES])
+	all_data_int = adc_session.analysis(adc_frame_start, adc_frame_count)
+	return all_data_int, adc_session.elapsed_time
 
 
 if __name__ == '__main__':
-	main(ADC_FRAME_START, ADC_FRAME_NUMBER)
\ No newline at end of file
+	main(ADC_FRAME_START, ADC_FRAME_NUMBER)
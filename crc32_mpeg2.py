@@ -0,0 +1,88 @@
+'''
+## Вычисление CRC32-MPEG2 (полином 0x04C11DB7, без отражения бит, начальное значение 0xFFFFFFFF)
+###### **calc** CRC одного буфера байт, табличный алгоритм (эталон для самопроверки)
+###### **calc_words** CRC всех фреймов файла за один вызов (slice-by-4, векторизация по фреймам)
+###### **check_frames** номера фреймов с ошибкой CRC
+###### **self_check** сравнение calc_words с эталонным calc и контрольным значением CRC32-MPEG2
+'''
+import numpy as np
+
+CRC32_MPEG2_POLY = 0x04C11DB7      # Полином CRC32-MPEG2
+CRC32_MPEG2_INIT = 0xFFFFFFFF      # Начальное значение CRC
+CRC32_MPEG2_CHECK = 0x0376E6E7     # Контрольное значение: CRC строки '123456789'
+
+def crc_tables_create():
+	'''
+	Brief Заполнение таблиц для вычисления CRC по 4 байта за шаг (slice-by-4) \n
+	Return Массив 4x256: таблица [k] - вклад байта, за которым следуют k нулевых байт \n
+	'''
+	crc_tables = np.zeros((4, 256), dtype=np.uint32)
+	for byte_value in range(256):
+		crc = byte_value << 24
+		for bit_idx in range(8):
+			if crc & 0x80000000:
+				crc = ((crc << 1) ^ CRC32_MPEG2_POLY) & 0xFFFFFFFF
+			else:
+				crc = (crc << 1) & 0xFFFFFFFF
+		crc_tables[0][byte_value] = crc
+	for table_idx in range(1, 4):
+		crc_tables[table_idx] = (crc_tables[table_idx - 1] << 8) ^ crc_tables[0][crc_tables[table_idx - 1] >> 24]
+	return crc_tables
+
+crc_tables = crc_tables_create()
+crc_table_list = crc_tables[0].tolist()
+
+def calc(data):
+	'''
+	Brief Вычисление CRC буфера байт (байты обрабатываются в порядке следования) \n
+	Param[in] *data* буфер байт \n
+	Return Значение CRC \n
+	'''
+	crc = CRC32_MPEG2_INIT
+	for byte_value in bytes(data):
+		crc = ((crc << 8) & 0xFFFFFFFF) ^ crc_table_list[(crc >> 24) ^ byte_value]
+	return crc
+
+def calc_words(frame_words):
+	'''
+	Brief Вычисление CRC всех фреймов одновременно. Каждое 32-битное слово обрабатывается \n
+	начиная со старшего байта, что совпадает с расчетом CRC по данным с измененным порядком байт \n
+	Param[in] *frame_words* двумерный массив 32-битных слов: строка - фрейм \n
+	Return Массив значений CRC, по одному на фрейм (uint32) \n
+	'''
+	frame_words = np.asarray(frame_words)
+	if 1 == frame_words.ndim:
+		frame_words = frame_words.reshape(1, -1)
+	# Слова с одинаковым номером во всех фреймах располагаются в памяти подряд
+	words_by_position = np.ascontiguousarray(frame_words.T, dtype=np.uint32)
+	crc = np.full(frame_words.shape[0], CRC32_MPEG2_INIT, dtype=np.uint32)
+	for words in words_by_position:
+		crc ^= words
+		crc = crc_tables[3][crc >> 24] ^ crc_tables[2][(crc >> 16) & 0xFF] ^ \
+			crc_tables[1][(crc >> 8) & 0xFF] ^ crc_tables[0][crc & 0xFF]
+	return crc
+
+def check_frames(frame_words, crc_file):
+	'''
+	Brief Проверка CRC всех фреймов за один вызов \n
+	Param[in] *frame_words* двумерный массив 32-битных слов: строка - фрейм \n
+	Param[in] *crc_file* значения CRC, записанные в файл для каждого фрейма \n
+	Return Список номеров фреймов с ошибкой CRC \n
+	'''
+	crc_calc = calc_words(frame_words)
+	return np.flatnonzero(crc_calc != np.asarray(crc_file, dtype=np.uint32)).tolist()
+
+def self_check(frame_count=8, word_count=2050):
+	'''
+	Brief Самопроверка: CRC контрольной строки и совпадение calc_words с побайтовым calc \n
+	на случайных фреймах (слова передаются в calc начиная со старшего байта) \n
+	Param[in] *frame_count* кол-во случайных фреймов \n
+	Param[in] *word_count* кол-во 32-битных слов во фрейме \n
+	Return True - проверка пройдена \n
+	'''
+	frame_words = np.random.default_rng(0).integers(0, 2**32, (frame_count, word_count), dtype=np.uint32)
+	crc_reference = [calc(frame.astype('>u4').tobytes()) for frame in frame_words]
+	return CRC32_MPEG2_CHECK == calc(b'123456789') and crc_reference == calc_words(frame_words).tolist()
+
+if __name__ == '__main__':
+	print('CRC32-MPEG2 self check: ', self_check())
@@ -1,8 +1,8 @@
 '''
 ## Чтение и проверка данных диагностики с SD карты
 '''
-import os, io, shutil, json, array, zlib, fattime
-from crccheck.crc import Crc32Mpeg2
+import os, crc32_mpeg2, fattime, sd_index, sd_reader, time_sequence
+import numpy as np
 from datetime import datetime
 
 DIAGNOSTICS_DATA_COUNT = 13
@@ -10,122 +10,187 @@ ADC_FRAME_COUNT = 1800
 DIAG_DATA_WIDTH = 4
 VOLTAGE_POINTS_COUNT = 20
 CHECK_CRC = True
+USE_INDEX_CACHE = True # Сохранять результаты проверки фреймов в индексный файл и использовать их при повторном чтении
+DIAG_FRAME_SIZE = 4 + VOLTAGE_POINTS_COUNT * 2 + 4 * 2 + 4 # Размер фрейма в файле: метка времени, данные, CRC
+DIAG_FILENAME = 'DIAG.DAT'
 
-date_time_max = {
-	'sec': 58,
-	'min': 59,
-	'hour': 23,
-}
+# Структура фрейма данных диагностики в файле
+diag_frame_dtype = np.dtype([
+	('time', '<u4'),                                  # Временная метка в формате FAT_TIME
+	('inp_voltage', '<u2', (VOLTAGE_POINTS_COUNT,)),  # Входное напряжение, 20 точек за фрейм
+	('hum_int', '<u2'),                               # Влажность внутри корпуса
+	('temp_int', '<i2'),                              # Температура внутри корпуса
+	('hum_ext', '<u2'),                               # Влажность снаружи корпуса
+	('temp_ext', '<i2'),                              # Температура снаружи корпуса
+	('crc', '<u4'),                                   # CRC32-MPEG2 фрейма, записанная в файл
+])
 
-def diag_frame_analysis_fast(input_file):
+def diag_file_open(file_name):
 	'''
-	Brief Преобразование данных диагностики и проверка контрольной суммы \n
-	Param[in] *input_file* файл для чтения данных \n
-	Return Вычисленное значение CRC \n
+	Brief Открытие файла данных диагностики для произвольного доступа к фреймам по номеру \n
+	Param[in] *file_name* имя файла данных диагностики \n
+	Return Объект sd_reader.FrameReader, фреймы со структурой diag_frame_dtype \n
 	'''
-	# Вычисление CRC по данным диагностики, с измением порядка байт
-	diag_data = bytearray(input_file.read(DIAGNOSTICS_DATA_COUNT * DIAG_DATA_WIDTH))
-	for sample_idx in range(0, DIAGNOSTICS_DATA_COUNT):
-		sample_data = []
-		for byte_idx in range(4):
-			sample_data.append(diag_data[(sample_idx * DIAG_DATA_WIDTH) + (3 - byte_idx)])
-		for byte_idx in range(4):
-			diag_data[(sample_idx * DIAG_DATA_WIDTH) + byte_idx] =  sample_data[byte_idx]
-	input_file.read(DIAG_DATA_WIDTH)
-	if True == CHECK_CRC:
-		return Crc32Mpeg2.calc(diag_data)
-	else:
-		return 0
+	return sd_reader.FrameReader(file_name, diag_frame_dtype)
+
+def diag_frames_crc(diag_frames):
+	'''
+	Brief Вычисление CRC всех фреймов данных диагностики по тому же буферу, без повторного чтения \n
+	Param[in] *diag_frames* массив фреймов со структурой diag_frame_dtype \n
+	Return Массив вычисленных значений CRC \n
+	'''
+	frame_words = diag_frames.view('<u4').reshape(len(diag_frames), DIAG_FRAME_SIZE // DIAG_DATA_WIDTH)
+	# CRC вычисляется по всем словам фрейма, кроме последнего (CRC, записанная в файл)
+	return crc32_mpeg2.calc_words(frame_words[:, :DIAGNOSTICS_DATA_COUNT])
+
+def diag_frames_follow(file_name, chunk_process, diag_frame_start=0, poll_interval=sd_reader.FOLLOW_POLL_INTERVAL, idle_timeout=None, stop_event=None):
+	'''
+	Brief Чтение файла данных диагностики, в который еще идет запись: проверяются только новые полные фреймы \n
+	Param[in] *file_name* имя файла данных диагностики \n
+	Param[in] *chunk_process* функция обработки порции данных (например, queue.Queue.put), порция - словарь: \n
+	номер первого фрейма, массивы данных как у main, статус CRC каждого фрейма, номера фреймов с ошибкой времени \n
+	Param[in] *diag_frame_start* номер фрейма, с которого начинается чтение \n
+	Param[in] *poll_interval* интервал опроса размера файла, [s] \n
+	Param[in] *idle_timeout* остановка, если файл не растет заданное время, [s] (None - без ограничения) \n
+	Param[in] *stop_event* объект threading.Event для остановки из другого потока \n
+	Return Количество прочитанных фреймов (номер фрейма для продолжения чтения) \n
+	'''
+	previous_time = [None]
+
+	def frames_process(frame_start, diag_frames):
+		if 0 == frame_start:
+			previous_time[0] = None # Файл начат заново: метки новой записи не сравниваются с предыдущей
+		diag_chunk = {
+			'frame_idx': frame_start,
+			'frame_time': diag_frames['time'].copy(),
+			'inp_voltage': diag_frames['inp_voltage'].reshape(-1),
+			'hum_int': diag_frames['hum_int'].copy(),
+			'temp_int': diag_frames['temp_int'].copy(),
+			'hum_ext': diag_frames['hum_ext'].copy(),
+			'temp_ext': diag_frames['temp_ext'].copy(),
+			'crc_ok': np.ones(len(diag_frames), dtype=bool),
+			'time_err_frames': [frame_start + frame_idx for frame_idx in
+				time_sequence.check_time_continuation(diag_frames['time'], previous_time[0])],
+		}
+		if True == CHECK_CRC:
+			diag_chunk['crc_ok'] = diag_frames_crc(diag_frames) == diag_frames['crc']
+		previous_time[0] = diag_chunk['frame_time'][-1]
+		chunk_process(diag_chunk)
+
+	diag_follower = sd_reader.FrameFollower(file_name, diag_frame_dtype, diag_frame_start)
+	return diag_follower.follow(frames_process, poll_interval, idle_timeout, stop_event)
+
+def diag_index_build(file_name):
+	'''
+	Brief Проверка всех фреймов файла данных диагностики для построения индекса \n
+	Param[in] *file_name* имя файла данных диагностики \n
+	Return Словарь массивов индекса (см. sd_index) \n
+	'''
+	with diag_file_open(file_name) as diag_file:
+		diag_frames = diag_file.frames()
+		frame_index = sd_index.index_create(DIAG_FRAME_SIZE, diag_frames['time'], diag_frames['crc'],
+			diag_frames_crc(diag_frames), np.ones(len(diag_frames), dtype=bool))
+		del diag_frames
+	frame_index['time_ok'][time_sequence.check_time_sequence(frame_index['frame_time'])['err_frames']] = False
+	return frame_index
 
-def check_time_sequence(time_current, time_last):
+def inp_voltage_stats(inp_voltage):
 	'''
-	Brief Проверка последовательности временных меток \n
-	Param[in] *time_current* текущая временная метка \n
-	Param[in] *time_last* прошлая временная метка \n
-	Return Статус ошибки \n
+	Brief Статистика входного напряжения по всем точкам каждого фрейма \n
+	Param[in] *inp_voltage* точки входного напряжения, VOLTAGE_POINTS_COUNT на фрейм \n
+	Return Словарь массивов: минимум, максимум, среднее, СКО для каждого фрейма \n
 	'''
-	min_decrement = False
-	sequence_error = False
-	last_frame_time_calc = {
-		'sec': 0,
-		'min': 0,
+	voltage_points = np.asarray(inp_voltage).reshape(-1, VOLTAGE_POINTS_COUNT)
+	return {
+		'min': voltage_points.min(axis=1),
+		'max': voltage_points.max(axis=1),
+		'mean': voltage_points.mean(axis=1),
+		'std': voltage_points.std(axis=1),
 	}
 
-	if (0 == time_current['sec']):
-		last_frame_time_calc['sec'] = date_time_max['sec']
-		min_decrement = True
-	else:
-		last_frame_time_calc['sec'] = time_current['sec'] - 2
-	if True == min_decrement:
-		if (0 == time_current['min']):
-			last_frame_time_calc['min'] = date_time_max['min']
-		else:
-			last_frame_time_calc['min'] = time_current['min'] - 1
-	else:
-		last_frame_time_calc['min'] = time_current['min']
-	if (last_frame_time_calc['sec'] != time_last['sec']) or \
-		(last_frame_time_calc['min'] != time_last['min']):
-		sequence_error = True
-	return sequence_error
+def inp_voltage_rollup(frame_time, inp_voltage, period):
+	'''
+	Brief Статистика входного напряжения за интервалы времени (например, минута или час) \n
+	Param[in] *frame_time* метки времени фреймов FAT_TIME \n
+	Param[in] *inp_voltage* точки входного напряжения, VOLTAGE_POINTS_COUNT на фрейм \n
+	Param[in] *period* длительность интервала, [s] \n
+	Return Словарь массивов: начало интервала (секунды от 1970-01-01), кол-во фреймов, \n
+	минимум, максимум, среднее, СКО по всем точкам интервала \n
+	'''
+	voltage_points = np.asarray(inp_voltage).reshape(-1, VOLTAGE_POINTS_COUNT).astype(np.float64)
+	period_start = fattime.convert_to_seconds_array(frame_time) // period * period
+	# Фреймы в файле идут по порядку: интервал - непрерывная группа фреймов с одинаковым началом интервала
+	group_start = np.flatnonzero(np.diff(period_start, prepend=period_start[:1] - 1))
+	group_frames = np.diff(np.append(group_start, len(voltage_points)))
+	group_points = group_frames * VOLTAGE_POINTS_COUNT
+	group_mean = np.add.reduceat(voltage_points.sum(axis=1), group_start) / group_points
+	group_square_mean = np.add.reduceat((voltage_points ** 2).sum(axis=1), group_start) / group_points
+	return {
+		'time': period_start[group_start],
+		'frames': group_frames,
+		'min': np.minimum.reduceat(voltage_points.min(axis=1), group_start),
+		'max': np.maximum.reduceat(voltage_points.max(axis=1), group_start),
+		'mean': group_mean,
+		'std': np.sqrt(np.maximum(group_square_mean - group_mean ** 2, 0)),
+	}
 
-def main(adc_frame_count):
+def main(adc_frame_count, data_dir='.'):
 	''' #MAIN
-	Brief Чтение данных диагностики за один час \n
+	Brief Чтение данных диагностики за один час. Файл разбирается за один проход по отображенному в память буферу \n
 	Param[in] *adc_frame_count* количество фреймов данных, которые нужно прочитать \n
-	Return Словарь данных диагностики, 1800 значений каждого параметра, время, затраченное на обработку \n
+	Param[in] *data_dir* каталог с файлами данных сеанса записи \n
+	Return Словарь массивов данных диагностики (метки времени FAT_TIME, по 20 точек входного напряжения \n
+	на фрейм, влажность, температура, CRC), 1800 значений каждого параметра, время, затраченное на обработку \n
 	'''
-	DIAG_FILENAME = 'DIAG.DAT'
-	diag_files = []
 	if adc_frame_count > ADC_FRAME_COUNT:
 		adc_frame_count = ADC_FRAME_COUNT
 	start_datetime = datetime.now()
 	# Открыть бинарный файл для чтения
-	diag_files.append(open(DIAG_FILENAME, 'rb'))
-	
+	diag_file_name = os.path.join(data_dir, DIAG_FILENAME)
+	diag_file = diag_file_open(diag_file_name)
+	diag_frames = diag_file.frames(0, adc_frame_count)
+
 	diag_frame_descr = {
-		'frame_time': [],
-		'inp_voltage': [],
-		'hum_int': [],
-		'temp_int': [],
-		'hum_ext': [],
-		'temp_ext': [],
-		'crc_file': [],
-		'crc_calc': [],
+		'frame_time': diag_frames['time'].copy(),
+		'inp_voltage': diag_frames['inp_voltage'].reshape(-1),
+		'hum_int': diag_frames['hum_int'].copy(),
+		'temp_int': diag_frames['temp_int'].copy(),
+		'hum_ext': diag_frames['hum_ext'].copy(),
+		'temp_ext': diag_frames['temp_ext'].copy(),
+		'crc_file': diag_frames['crc'].copy(),
+		'crc_calc': None,
 	}
 	crc_ok = True
 	crc_err_frames = []
-	time_sequence = True
-	time_sequence_err_frames = []
-	for frame_idx in range(adc_frame_count):
-		diag_frame_descr['frame_time'].append( fattime.convert_from_fattime(diag_files[0].read(4)) )
-		for voltage_point_index in range (VOLTAGE_POINTS_COUNT):
-			diag_frame_descr['inp_voltage'].append( int.from_bytes(diag_files[0].read(2), byteorder = 'little', signed = False) )
-		diag_frame_descr['hum_int'].append( int.from_bytes(diag_files[0].read(2), byteorder = 'little', signed = False) )
-		diag_frame_descr['temp_int'].append( int.from_bytes(diag_files[0].read(2), byteorder = 'little', signed = True) )
-		diag_frame_descr['hum_ext'].append( int.from_bytes(diag_files[0].read(2), byteorder = 'little', signed = False) )
-		diag_frame_descr['temp_ext'].append( int.from_bytes(diag_files[0].read(2), byteorder = 'little', signed = True) )
-		diag_frame_descr['crc_file'].append( int.from_bytes(diag_files[0].read(4), byteorder = 'little', signed = False) )
-		diag_files[0].seek(-(DIAGNOSTICS_DATA_COUNT + 1) * DIAG_DATA_WIDTH, 1)
-
-		diag_frame_descr['crc_calc'].append( diag_frame_analysis_fast(diag_files[0]) )
-		if (diag_frame_descr['crc_calc'][frame_idx] != diag_frame_descr['crc_file'][frame_idx]):
-			if True == CHECK_CRC:
-				crc_ok = False
-				crc_err_frames.append(frame_idx)
-			else:
-				crc_ok = 'Not tested'''
+	# Результаты проверки из индексного файла, если файл данных не изменился
+	frame_index = None
+	if True == USE_INDEX_CACHE and True == CHECK_CRC:
+		frame_index = sd_index.index_get(diag_file_name, diag_index_build)
+	if frame_index is not None:
+		diag_frame_descr['crc_calc'] = frame_index['crc_calc'][:len(diag_frames)]
+		time_sequence_err_frames = (np.flatnonzero(~frame_index['time_ok'][1:len(diag_frames)]) + 1).tolist()
+	else:
+		if True == CHECK_CRC:
+			diag_frame_descr['crc_calc'] = diag_frames_crc(diag_frames)
+		else:
+			diag_frame_descr['crc_calc'] = np.zeros(len(diag_frames), dtype=np.uint32)
 		# Проверка последовательности временных меток
-		if (frame_idx > 0) and (True == check_time_sequence(diag_frame_descr['frame_time'][frame_idx], diag_frame_descr['frame_time'][frame_idx - 1])):
-			time_sequence = False
-			time_sequence_err_frames.append(frame_idx)
+		time_sequence_err_frames = time_sequence.check_time_sequence(diag_frame_descr['frame_time'])['err_frames']
+	del diag_frames
+	diag_file.close()
+	if True == CHECK_CRC:
+		crc_err_frames = np.flatnonzero(diag_frame_descr['crc_calc'] != diag_frame_descr['crc_file']).tolist()
+		crc_ok = 0 == len(crc_err_frames)
+	else:
+		crc_ok = 'Not tested'
+	time_sequence_ok = 0 == len(time_sequence_err_frames)
 
-	print('Diagnostics ', ':: crc_ok = ', crc_ok, ':: time_sequence = ', time_sequence)
+	print('Diagnostics ', ':: crc_ok = ', crc_ok, ':: time_sequence = ', time_sequence_ok)
 	print('crc_err idx: ', crc_err_frames, ':: time_err idx: ', time_sequence_err_frames)
-	diag_files[0].close()
-	
+
 	finish_datetime = datetime.now()
 	print('>__ Data analysis time is ' + str(finish_datetime - start_datetime))
 	return diag_frame_descr, finish_datetime - start_datetime
 
 if __name__ == '__main__':
-	main(ADC_FRAME_COUNT)
\ No newline at end of file
+	main(ADC_FRAME_COUNT)
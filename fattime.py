@@ -1,6 +1,9 @@
 '''
 # Преобразование форматов времени
 '''
+from datetime import datetime
+import numpy as np
+
 fat_time_offs = {
 	'sec': 1,
 	'min': 5,
@@ -57,4 +60,104 @@ def convert_to_fattime(timestamp):
 	fattime = fattime | (((timestamp['mon'] + 1) << fat_time_offs['mon']) & fat_time_mask['mon'])
 	fattime = fattime | (((timestamp['year'] - 1980) << fat_time_offs['year']) & fat_time_mask['year'])
 
-	return fattime
\ No newline at end of file
+	return fattime
+
+def convert_to_datetime(fat_time):
+	'''
+	Brief Преобразование временной метки из значения uint32_t (FAT_TIME format) в datetime \n
+	Param[in] *fat_time* временная метка в формате FAT_TIME \n
+	Return Временная метка datetime \n
+	'''
+	timestamp = convert_from_fattime(int(fat_time).to_bytes(4, byteorder = 'little', signed = False))
+	return datetime(timestamp['year'], timestamp['mon'] + 1, timestamp['day'], timestamp['hour'], timestamp['min'], timestamp['sec'])
+
+def convert_from_datetime(date_time):
+	'''
+	Brief Преобразование временной метки из datetime в значение uint32_t (FAT_TIME format) \n
+	Param[in] *date_time* временная метка datetime \n
+	Return Временная метка в формате FAT_TIME \n
+	'''
+	return convert_to_fattime({
+		'sec': date_time.second,
+		'min': date_time.minute,
+		'hour': date_time.hour,
+		'day': date_time.day,
+		'mon': date_time.month - 1,
+		'year': date_time.year,
+	})
+
+def fattime_array(fat_times):
+	'''
+	Brief Массив временных меток FAT_TIME из массива чисел или из буфера байт (uint32_t little-endian) \n
+	Param[in] *fat_times* массив, список или буфер временных меток \n
+	Return Массив временных меток uint32 \n
+	'''
+	if isinstance(fat_times, (bytes, bytearray, memoryview)):
+		return np.frombuffer(fat_times, dtype='<u4')
+	return np.asarray(fat_times, dtype=np.uint32)
+
+def convert_from_fattime_array(fat_times):
+	'''
+	Brief Преобразование массива временных меток uint32_t в словарь массивов секунд, минут, и т.д. \n
+	Param[in] *fat_times* массив или буфер временных меток в формате FAT_TIME \n
+	Return Словарь массивов с секундами, минутами, и т.д. (ключи как у convert_from_fattime) \n
+	'''
+	fat_times = fattime_array(fat_times).astype(np.int64)
+	return {
+		'sec': (fat_times & fat_time_mask['sec']) << fat_time_offs['sec'],
+		'min': (fat_times & fat_time_mask['min']) >> fat_time_offs['min'],
+		'hour': (fat_times & fat_time_mask['hour']) >> fat_time_offs['hour'],
+		'day': (fat_times & fat_time_mask['day']) >> fat_time_offs['day'],
+		'mon': ((fat_times & fat_time_mask['mon']) >> fat_time_offs['mon']) - 1,
+		'year': ((fat_times & fat_time_mask['year']) >> fat_time_offs['year']) + 1980,
+	}
+
+def convert_to_seconds_array(fat_times):
+	'''
+	Brief Преобразование массива временных меток uint32_t в секунды от 1970-01-01 \n
+	Param[in] *fat_times* массив или буфер временных меток в формате FAT_TIME \n
+	Return Массив секунд int64 \n
+	'''
+	timestamp = convert_from_fattime_array(fat_times)
+	months = ((timestamp['year'] - 1970) * 12 + timestamp['mon']).astype('datetime64[M]')
+	days = months.astype('datetime64[D]').astype(np.int64) + timestamp['day'] - 1
+	return days * 86400 + timestamp['hour'] * 3600 + timestamp['min'] * 60 + timestamp['sec']
+
+def convert_to_datetime64_array(fat_times):
+	'''
+	Brief Преобразование массива временных меток uint32_t в массив datetime64[s] \n
+	Param[in] *fat_times* массив или буфер временных меток в формате FAT_TIME \n
+	Return Массив datetime64[s] \n
+	'''
+	return convert_to_seconds_array(fat_times).astype('datetime64[s]')
+
+def convert_to_fattime_array(date_times):
+	'''
+	Brief Преобразование массива меток времени datetime64 (или секунд от 1970-01-01) в массив значений uint32_t (FAT_TIME format) \n
+	Param[in] *date_times* массив datetime64 или секунд int \n
+	Return Массив временных меток uint32 в формате FAT_TIME \n
+	'''
+	date_times = np.asarray(date_times)
+	if not np.issubdtype(date_times.dtype, np.datetime64):
+		date_times = date_times.astype('datetime64[s]')
+	date_times = date_times.astype('datetime64[s]')
+	days = date_times.astype('datetime64[D]')
+	months = date_times.astype('datetime64[M]')
+	day_seconds = (date_times - days).astype(np.int64)
+	month_number = months.astype(np.int64)
+	timestamp = {
+		'sec': day_seconds % 60,
+		'min': (day_seconds // 60) % 60,
+		'hour': day_seconds // 3600,
+		'day': (days - months.astype('datetime64[D]')).astype(np.int64) + 1,
+		'mon': month_number % 12,
+		'year': month_number // 12 + 1970,
+	}
+	fattime = np.zeros(date_times.shape, dtype=np.int64)
+	fattime = fattime | ((timestamp['sec'] >> fat_time_offs['sec']) & fat_time_mask['sec'])
+	fattime = fattime | ((timestamp['min'] << fat_time_offs['min']) & fat_time_mask['min'])
+	fattime = fattime | ((timestamp['hour'] << fat_time_offs['hour']) & fat_time_mask['hour'])
+	fattime = fattime | ((timestamp['day'] << fat_time_offs['day']) & fat_time_mask['day'])
+	fattime = fattime | (((timestamp['mon'] + 1) << fat_time_offs['mon']) & fat_time_mask['mon'])
+	fattime = fattime | (((timestamp['year'] - 1980) << fat_time_offs['year']) & fat_time_mask['year'])
+	return fattime.astype(np.uint32)
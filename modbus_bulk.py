@@ -0,0 +1,101 @@
+'''
+## Чтение больших массивов регистров ModBus блоками (например, данных АЦП из RAM-буфера устройства)
+###### Регистры записываются сразу в заранее выделенный буфер uint16, повторно запрашиваются только блоки с ошибкой
+###### обмена. Ответ с кодом исключения ModBus (например, недопустимый адрес) окончательный и не повторяется.
+'''
+import time
+import numpy as np
+import modbus_plan
+
+try:
+	from pymodbus.exceptions import ModbusException
+except ImportError:
+	ModbusException = IOError
+
+BULK_BLOCK_SIZE = 123 # Кол-во регистров в одном запросе
+BULK_RETRIES = 3 # Кол-во повторных запросов блока с ошибкой
+
+# Ошибки обмена, после которых блок запрашивается повторно
+bulk_read_errors = (IOError, OSError, ModbusException)
+
+def bulk_blocks(reg_addr, reg_count, block_size=BULK_BLOCK_SIZE):
+	'''
+	Brief Разбиение диапазона регистров на блоки запросов \n
+	Param[in] *reg_addr* начальный адрес \n
+	Param[in] *reg_count* кол-во регистров \n
+	Param[in] *block_size* кол-во регистров в одном запросе \n
+	Return Список блоков (начальный адрес, кол-во регистров) \n
+	'''
+	return [(block_addr, min(block_size, reg_addr + reg_count - block_addr))
+		for block_addr in range(reg_addr, reg_addr + reg_count, block_size)]
+
+def bulk_report(blocks, attempts, failed_blocks, elapsed_time):
+	'''
+	Brief Отчет чтения: кол-во запросов, повторов, ошибок и скорость обмена \n
+	Param[in] *blocks* список блоков (начальный адрес, кол-во регистров) \n
+	Param[in] *attempts* общее кол-во отправленных запросов \n
+	Param[in] *failed_blocks* блоки, которые не удалось прочитать \n
+	Param[in] *elapsed_time* время чтения, [s] \n
+	Return Словарь отчета \n
+	'''
+	link_report = modbus_plan.plan_report(blocks)
+	data_bytes = link_report['registers'] * 2
+	link_bytes = link_report['request_bytes'] + link_report['response_bytes']
+	return {
+		'blocks': len(blocks),
+		'requests': attempts,
+		'retries': attempts - len(blocks),
+		'failed_blocks': failed_blocks,
+		'data_bytes': data_bytes,
+		'elapsed_s': elapsed_time,
+		# Полезные данные и все байты кадров RTU (без учета повторов) в секунду
+		'data_bytes_per_s': data_bytes / elapsed_time if elapsed_time > 0 else None,
+		'link_bytes_per_s': link_bytes / elapsed_time if elapsed_time > 0 else None,
+	}
+
+def response_ok(response, block_count):
+	'''
+	Brief Проверка ответа: нет ошибки ModBus и получено нужное кол-во регистров \n
+	'''
+	return response is not None and False == response.isError() and len(response.registers) >= block_count
+
+def response_exception(response):
+	'''
+	Brief Проверка ответа с кодом исключения ModBus (устройство ответило, повтор запроса даст тот же ответ) \n
+	'''
+	return response is not None and response.isError() and hasattr(response, 'exception_code')
+
+def read_bulk(read_func, reg_addr, reg_count, block_size=BULK_BLOCK_SIZE, retries=BULK_RETRIES):
+	'''
+	Brief Чтение диапазона регистров блоками в заранее выделенный буфер \n
+	Param[in] *read_func* функция чтения (начальный адрес, кол-во регистров), возвращает ответ с полем registers \n
+	Param[in] *reg_addr* начальный адрес \n
+	Param[in] *reg_count* кол-во регистров \n
+	Param[in] *block_size* кол-во регистров в одном запросе \n
+	Param[in] *retries* кол-во повторных запросов блока с ошибкой обмена (блок с ответом-исключением не повторяется) \n
+	Return Буфер регистров uint16 и отчет чтения (см. bulk_report) \n
+	'''
+	start_time = time.perf_counter()
+	regs_buffer = np.zeros(reg_count, dtype=np.uint16)
+	blocks = bulk_blocks(reg_addr, reg_count, block_size)
+	pending_blocks = blocks
+	rejected_blocks = []
+	attempts = 0
+	for attempt_idx in range(retries + 1):
+		failed_blocks = []
+		for block_addr, block_count in pending_blocks:
+			attempts += 1
+			try:
+				response = read_func(block_addr, block_count)
+			except bulk_read_errors:
+				response = None
+			if True == response_ok(response, block_count):
+				regs_buffer[block_addr - reg_addr:block_addr - reg_addr + block_count] = response.registers[:block_count]
+			elif True == response_exception(response):
+				rejected_blocks.append((block_addr, block_count))
+			else:
+				failed_blocks.append((block_addr, block_count))
+		pending_blocks = failed_blocks
+		if 0 == len(pending_blocks):
+			break
+	return regs_buffer, bulk_report(blocks, attempts, sorted(rejected_blocks + pending_blocks), time.perf_counter() - start_time)
@@ -66,48 +66,36 @@ def parse_ffts(ffts_regs):
 	'''
 	Brief Разбор данных частотного анализа \n
 	Param[in] *ffts_regs* набор регистров с данными частотного анализа \n
-	Return Объект с данными частотного анализа \n
+	Return Объект с данными частотного анализа: массивы RMS и макс. амплитуды гармоник каждого канала, [mV] \n
 	'''
 	FREQ_BLOCK_REG_COUNT = 96  # Кол-во анализируемых гармоник
 	TIME_REG_COUNT = 2         # Кол-во регистров времени
 	CH_REG_COUNT = FREQ_BLOCK_REG_COUNT * 4 + TIME_REG_COUNT  # Полное кол-во регистров частотного анализа для одного канала
+	HARM_COUNT = FREQ_BLOCK_REG_COUNT  # Кол-во гармоник в двух блоках (по 2 регистра на значение float32)
 
-	# Создадим объект для хранения полученных данных частотного анализа
-	freq_data = {
-		'ch1': {
-			'harm_rms': [],	'harm_max': [], 'time' : 0, },
-		'ch2': {
-			'harm_rms': [],	'harm_max': [],	'time' : 0, },
-		'ch3': {
-			'harm_rms': [],	'harm_max': [],	'time' : 0, },
-	}
+	# Регистры всех каналов и блоков в одном буфере uint16 (канал, блок, регистр), пары регистров - значения float32
+	ffts_words = np.array([[ffts_regs[ch_name][block_idx].registers[:FREQ_BLOCK_REG_COUNT] for block_idx in range(4)]
+		for ch_name in ch_list], dtype='<u2')
+	# Физическое значение гармоник, нормализация по длине массива. Блоки 0, 1 - RMS, блоки 2, 3 - амплитуда
+	harm_values = ffts_words.view('<f4').astype(np.float64) / ADC_SAMPLE_NUMBER * ADC_SCALE
+	harm_values = harm_values.reshape(len(ch_list), 2, HARM_COUNT)
+	# Умножим амплитуду на 2 с учетом энергии комплексной составляющей для всех частот кроме нулевой,
+	# для RMS дополнительно умножим на sqrt(2)/2
+	rms_scale = np.full(HARM_COUNT, 2 * (math.sqrt(2) / 2))
+	rms_scale[0] = 1
+	max_scale = np.full(HARM_COUNT, 2.0)
+	max_scale[0] = 1
+	harm_rms = harm_values[:, 0] * rms_scale
+	harm_max = harm_values[:, 1] * max_scale
 
-	for ch_idx in range(3):
-		ch_name = ch_list[ch_idx]
-		for block_idx in range(4):
-			for harm_idx in range(int(FREQ_BLOCK_REG_COUNT / 2)):
-				real_bytes = []
-				real_bytes.append( (ffts_regs[ch_name][block_idx].registers[(harm_idx * 2) + 0] & 0x00FF) >> 0 )
-				real_bytes.append( (ffts_regs[ch_name][block_idx].registers[(harm_idx * 2) + 0] & 0xFF00) >> 8 )
-				real_bytes.append( (ffts_regs[ch_name][block_idx].registers[(harm_idx * 2) + 1] & 0x00FF) >> 0 )
-				real_bytes.append( (ffts_regs[ch_name][block_idx].registers[(harm_idx * 2) + 1] & 0xFF00) >> 8 )
-				real_bytes_np = np.array(real_bytes, dtype=np.uint8)
-				real_as_float = real_bytes_np.view(dtype=np.float32)
-				if block_idx < 2:
-					# Вычисление физического значения RMS гармоники, нормализация по длине массива
-					harm_rms = (real_as_float[0] / ADC_SAMPLE_NUMBER) * ADC_SCALE
-					# Умножим амплитуду на 2 с учетом энергии комплексной составляющей для всех частот кроме нулевой, и вычислим RMS как *sqrt(2)/2
-					if not (0 == block_idx and 0 == harm_idx):
-						harm_rms = harm_rms * 2 * (math.sqrt(2) / 2)
-					freq_data[ch_name]['harm_rms'].append(harm_rms)
-				elif block_idx < 4:
-					# Вычисление физического значения амплитуды гармоники, нормализация по длине массива
-					max_ampl = (real_as_float[0] / ADC_SAMPLE_NUMBER) * ADC_SCALE
-					# Умножим амплитуду на 2 с учетом энергии комплексной составляющей для всех частот кроме нулевой
-					if not (2 == block_idx and 0 == harm_idx):
-						max_ampl = max_ampl * 2
-					freq_data[ch_name]['harm_max'].append(max_ampl)
-		freq_data[ch_name]['time'] = ffts_regs['time']
+	# Создадим объект для хранения полученных данных частотного анализа
+	freq_data = {}
+	for ch_idx in range(len(ch_list)):
+		freq_data[ch_list[ch_idx]] = {
+			'harm_rms': harm_rms[ch_idx],
+			'harm_max': harm_max[ch_idx],
+			'time': ffts_regs['time'],
+		}
 	return freq_data
 
 def parse_adc(adc_data_regs, time_stamp):
@@ -115,38 +103,28 @@ def parse_adc(adc_data_regs, time_stamp):
 	Brief  Разбор бинарных данных АЦП, прочитанных с карты памяти SD \n
 	Param[in] *adc_data_regs* набор регистров с данными АЦП (100 блоков по 123 16-битных регистра) \n
 	Param[in] *time_stamp* временная метка \n
-	Return Объект с данными АЦП \n
+	Return Объект с данными АЦП: метка времени и CRC каждого канала, массивы значений float32, [mV] \n
 	'''
 	BLOCK_SIZE = 123
 	BLOCK_COUNT = 100
-	# Упакуем данные в 32-разрядные слова
 	REG_COUNT = BLOCK_SIZE * BLOCK_COUNT
 	WORD_COUNT = int(REG_COUNT / 2)
-	adc_data_words = []	
-	for word_idx in range(WORD_COUNT):
-		word_value = adc_data_regs[word_idx * 2 + 0] + (adc_data_regs[word_idx * 2 + 1] << 16)
-		adc_data_words.append(word_value)
-	# Упакуем данные в объект
 	WORDS_PER_CHANNEL = int(WORD_COUNT / 3)
+	# Упакуем данные в 32-разрядные слова: пары регистров (младший, старший) - слово little-endian.
+	# Слова каждого канала: метка времени, ADC_SAMPLE_NUMBER отсчетов, CRC
+	adc_data_words = np.asarray(adc_data_regs[:REG_COUNT], dtype='<u2').view('<u4').reshape(len(ch_list), WORDS_PER_CHANNEL)
+	# Арифметический сдвиг знакового слова выделяет 24-битный отсчет и расширяет знак
+	adc_samples = adc_data_words[:, 1:WORDS_PER_CHANNEL - 1].view('<i4') >> 8
+	# Преобразование в физическую величину
+	adc_values = np.multiply(adc_samples, ADC_SCALE, dtype=np.float32)
 
-	adc_data = {
-		'ch1': {
-			'timestamp': 0, 'data': [], 'crc': False, },
-		'ch2': {
-			'timestamp': 0, 'data': [], 'crc': False, },
-		'ch3': {
-			'timestamp': 0, 'data': [], 'crc': False, },
-	}
-	for ch_idx in range(3):
-		adc_data[ch_list[ch_idx]]['timestamp'] = adc_data_words[0 + (ch_idx * WORDS_PER_CHANNEL)]
-		for word_idx in range(1, WORDS_PER_CHANNEL - 1):
-			word_value = adc_data_words[word_idx + (ch_idx * WORDS_PER_CHANNEL)]
-			word_value = word_value >> 8
-			if word_value >= 0x800000:
-				word_value = (0x1000000 - word_value)*(-1)
-			# Преобразование в физическую величину и запись в объект
-			adc_data[ch_list[ch_idx]]['data'].append(word_value * ADC_SCALE)
-		adc_data[ch_list[ch_idx]]['crc'] = adc_data_words[word_idx + 1 + (ch_idx * WORDS_PER_CHANNEL)]
+	adc_data = {}
+	for ch_idx in range(len(ch_list)):
+		adc_data[ch_list[ch_idx]] = {
+			'timestamp': int(adc_data_words[ch_idx, 0]),
+			'data': adc_values[ch_idx],
+			'crc': int(adc_data_words[ch_idx, WORDS_PER_CHANNEL - 1]),
+		}
 	adc_data['service'] = {}
 	adc_data['service']['timestamp'] = time_stamp
-	return adc_data
\ No newline at end of file
+	return adc_data
@@ -0,0 +1,84 @@
+'''
+## Планирование чтения регистров ModBus: объединение близко расположенных диапазонов адресов в минимальное
+###### кол-во запросов (не более MODBUS_MAX_READ_REGS регистров в запросе) и разбор ответов обратно по диапазонам.
+###### Каждый запрос по шине RTU добавляет байты заголовка и CRC, паузы между кадрами и время ответа устройства,
+###### поэтому чтение нескольких лишних регистров между диапазонами выгоднее отдельного запроса.
+'''
+import numpy as np
+
+MODBUS_MAX_READ_REGS = 125   # Максимальное кол-во регистров в одном запросе чтения (Read Holding Registers)
+MODBUS_READ_MAX_GAP = 8      # Максимальное кол-во лишних регистров между диапазонами, читаемых ради объединения запросов
+RTU_REQUEST_BYTES = 8        # Байт в запросе чтения RTU: адрес, функция, адрес регистра, кол-во, CRC
+RTU_RESPONSE_OVERHEAD = 5    # Байт в ответе RTU без данных: адрес, функция, кол-во байт, CRC
+
+class RegistersResponse(object):
+	'''
+	Brief Набор регистров одного диапазона (аналог ответа pymodbus с полем registers) \n
+	'''
+	def __init__(self, registers):
+		self.registers = registers
+
+	def isError(self):
+		'''
+		Brief Признак ошибки обмена (набор регистров получен без ошибок) \n
+		'''
+		return False
+
+def read_plan(reg_ranges, max_regs=MODBUS_MAX_READ_REGS, max_gap=MODBUS_READ_MAX_GAP):
+	'''
+	Brief Формирование списка запросов чтения для набора диапазонов регистров \n
+	Param[in] *reg_ranges* список диапазонов (начальный адрес, кол-во регистров) \n
+	Param[in] *max_regs* максимальное кол-во регистров в одном запросе \n
+	Param[in] *max_gap* максимальное кол-во лишних регистров между объединяемыми диапазонами \n
+	Return Список запросов (начальный адрес, кол-во регистров), упорядоченный по адресу \n
+	'''
+	# Объединение диапазонов, которые пересекаются или разделены не более чем max_gap регистрами
+	spans = []
+	for reg_addr, reg_count in sorted(reg_ranges):
+		if len(spans) > 0 and reg_addr <= spans[-1][1] + max_gap:
+			spans[-1][1] = max(spans[-1][1], reg_addr + reg_count)
+		else:
+			spans.append([reg_addr, reg_addr + reg_count])
+	# Разбиение непрерывных участков на запросы допустимой длины
+	reads = []
+	for span_start, span_stop in spans:
+		for read_addr in range(span_start, span_stop, max_regs):
+			reads.append((read_addr, min(max_regs, span_stop - read_addr)))
+	return reads
+
+def plan_report(reads):
+	'''
+	Brief Оценка объема обмена по шине RTU для списка запросов \n
+	Param[in] *reads* список запросов (начальный адрес, кол-во регистров) \n
+	Return Словарь: кол-во запросов, кол-во прочитанных регистров, байт в запросах и ответах \n
+	'''
+	reg_count = sum(read_count for read_addr, read_count in reads)
+	return {
+		'transactions': len(reads),
+		'registers': reg_count,
+		'request_bytes': len(reads) * RTU_REQUEST_BYTES,
+		'response_bytes': len(reads) * RTU_RESPONSE_OVERHEAD + reg_count * 2,
+	}
+
+def read_ranges(read_func, reg_ranges, max_regs=MODBUS_MAX_READ_REGS, max_gap=MODBUS_READ_MAX_GAP):
+	'''
+	Brief Чтение набора диапазонов регистров минимальным кол-вом запросов \n
+	Param[in] *read_func* функция чтения (начальный адрес, кол-во регистров), возвращает ответ с полем registers \n
+	(например, lambda addr, count: client.read_holding_registers(addr, count, slave_id)) \n
+	Param[in] *reg_ranges* список диапазонов (начальный адрес, кол-во регистров) \n
+	Param[in] *max_regs* максимальное кол-во регистров в одном запросе \n
+	Param[in] *max_gap* максимальное кол-во лишних регистров между объединяемыми диапазонами \n
+	Return Список ответов RegistersResponse в порядке reg_ranges и оценка объема обмена (см. plan_report) \n
+	'''
+	reads = read_plan(reg_ranges, max_regs, max_gap)
+	# Ответы записываются в один буфер, охватывающий все запрошенные адреса
+	buffer_addr = reads[0][0] if len(reads) > 0 else 0
+	buffer_regs = np.zeros(reads[-1][0] + reads[-1][1] - buffer_addr if len(reads) > 0 else 0, dtype=np.uint16)
+	for read_addr, read_count in reads:
+		response = read_func(read_addr, read_count)
+		if response.isError():
+			raise IOError('ModBus read error at register ' + str(read_addr) + ': ' + str(response))
+		buffer_regs[read_addr - buffer_addr:read_addr - buffer_addr + read_count] = response.registers[:read_count]
+	responses = [RegistersResponse(buffer_regs[reg_addr - buffer_addr:reg_addr - buffer_addr + reg_count].tolist())
+		for reg_addr, reg_count in reg_ranges]
+	return responses, plan_report(reads)
@@ -0,0 +1,294 @@
+'''
+## Транспорт ModBus: последовательный порт (RTU), ModBus TCP и RTU поверх TCP (GSM модем, преобразователь интерфейса)
+###### Соединения хранятся в пуле и не закрываются между циклами опроса: по каналу сотовой связи установка
+###### соединения занимает секунды. Простаивающее соединение поддерживается запросом keep-alive (и TCP keep-alive),
+###### разорванное соединение восстанавливается при следующей транзакции с увеличивающейся паузой между попытками.
+###### Устройство, несколько раз подряд не ответившее на запрос, временно не опрашивается: клиент TCP pymodbus
+###### закрывает соединение после каждого отсутствия ответа, и одно отключенное устройство за шлюзом иначе
+###### вызывало бы переподключение в каждом цикле опроса.
+###### Объект соединения заменяет клиент pymodbus в функциях skif_master (read_diag, read_ffts, read_adc_saved).
+'''
+import socket, threading, time
+from pymodbus.client import ModbusSerialClient, ModbusTcpClient
+from pymodbus.exceptions import ConnectionException, ModbusIOException
+from pymodbus.framer import ModbusRtuFramer, ModbusSocketFramer
+
+TRANSPORT_TIMEOUT = 10 # [s] Время ожидания ответа
+TRANSPORT_RETRIES = 1 # Кол-во повторов транзакции после восстановления разорванного соединения
+TRANSPORT_RECONNECT_DELAY = 1.0 # [s] Начальная пауза между попытками подключения
+TRANSPORT_RECONNECT_MAX_DELAY = 60.0 # [s] Максимальная пауза между попытками подключения
+TRANSPORT_SLAVE_TIMEOUTS = 3 # Кол-во запросов подряд без ответа устройства, после которого устройство временно не опрашивается
+TRANSPORT_SLAVE_BACKOFF = 5.0 # [s] Начальная пауза опроса устройства, не отвечающего на запросы
+TRANSPORT_SLAVE_BACKOFF_MAX = 300.0 # [s] Максимальная пауза опроса устройства, не отвечающего на запросы
+TRANSPORT_KEEPALIVE_PERIOD = 30.0 # [s] Время простоя соединения, после которого отправляется запрос keep-alive
+TCP_KEEPALIVE_IDLE = 20 # [s] TCP keep-alive: время простоя до первой проверки соединения
+TCP_KEEPALIVE_INTERVAL = 5 # [s] TCP keep-alive: интервал проверок
+TCP_KEEPALIVE_COUNT = 3 # TCP keep-alive: кол-во проверок без ответа до разрыва соединения
+
+# Виды транспорта: класс клиента pymodbus и формат кадра
+transport_types = {
+	'serial': (ModbusSerialClient, ModbusRtuFramer),       # ModBus RTU, последовательный порт
+	'tcp': (ModbusTcpClient, ModbusSocketFramer),          # ModBus TCP
+	'rtu_over_tcp': (ModbusTcpClient, ModbusRtuFramer),    # Кадры RTU через TCP соединение (GSM модем, шлюз без преобразования)
+}
+
+def transport_key(config):
+	'''
+	Brief Ключ соединения в пуле: вид транспорта и адрес \n
+	Param[in] *config* настройки соединения: 'transport' ('serial', 'tcp', 'rtu_over_tcp'), \n
+	'port' (имя порта или номер TCP порта), 'host', 'baudrate', 'timeout', 'keepalive_slave', 'keepalive_addr' \n
+	Return Строка вида tcp://host:port или serial://COM5 \n
+	'''
+	if 'serial' == config.get('transport', 'serial'):
+		return 'serial://' + str(config['port'])
+	return config['transport'] + '://' + str(config['host']) + ':' + str(config.get('port', 502))
+
+def tcp_keepalive_set(client_socket):
+	'''
+	Brief Включение TCP keep-alive: соединение через NAT оператора сотовой связи не закрывается при простое, \n
+	а обрыв канала обнаруживается без ожидания ответа на запрос \n
+	Param[in] *client_socket* сокет TCP соединения \n
+	'''
+	client_socket.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+	if hasattr(socket, 'SIO_KEEPALIVE_VALS'):
+		client_socket.ioctl(socket.SIO_KEEPALIVE_VALS, (1, TCP_KEEPALIVE_IDLE * 1000, TCP_KEEPALIVE_INTERVAL * 1000))
+	elif hasattr(socket, 'TCP_KEEPIDLE'):
+		client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, TCP_KEEPALIVE_IDLE)
+		client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, TCP_KEEPALIVE_INTERVAL)
+		client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPCNT, TCP_KEEPALIVE_COUNT)
+
+class ModbusConnection(object):
+	'''
+	Brief Постоянное соединение ModBus с восстановлением после разрыва. Методы чтения и записи регистров \n
+	совпадают с клиентом pymodbus, транзакции разных потоков выполняются по очереди \n
+	'''
+	def __init__(self, config):
+		'''
+		Brief Создание соединения (подключение выполняется при первой транзакции) \n
+		Param[in] *config* настройки соединения (см. transport_key) \n
+		'''
+		self.config = config
+		self.key = transport_key(config)
+		self.client = None
+		self.lock = threading.RLock()
+		self.last_used = 0.0
+		self.reconnect_delay = TRANSPORT_RECONNECT_DELAY
+		self.next_connect_time = 0.0
+		self.closed_after_timeout = False
+		# Устройства без ответа: {адрес: кол-во запросов подряд без ответа}, {адрес: [время следующего запроса, пауза]}
+		self.slave_timeouts = {}
+		self.slave_backoff = {}
+		self.stats = {'connects': 0, 'connect_errors': 0, 'link_errors': 0, 'timeouts': 0, 'timeout_reconnects': 0,
+			'slaves_skipped': 0, 'requests': 0, 'keepalives': 0}
+
+	def _client_create(self):
+		'''
+		Brief Создание клиента pymodbus по настройкам соединения \n
+		'''
+		client_class, framer = transport_types[self.config.get('transport', 'serial')]
+		timeout = self.config.get('timeout', TRANSPORT_TIMEOUT)
+		if ModbusSerialClient == client_class:
+			return ModbusSerialClient(self.config['port'], framer=framer, baudrate=self.config.get('baudrate', 115200),
+				parity='N', stopbits=1, timeout=timeout)
+		return ModbusTcpClient(self.config['host'], port=self.config.get('port', 502), framer=framer, timeout=timeout)
+
+	def connect(self):
+		'''
+		Brief Подключение, если соединение не установлено. Повторная попытка после ошибки выполняется \n
+		не раньше, чем через паузу, удваиваемую после каждой неудачи (до TRANSPORT_RECONNECT_MAX_DELAY) \n
+		Return True - соединение установлено \n
+		'''
+		with self.lock:
+			if self.client is not None:
+				return True
+			if time.monotonic() < self.next_connect_time:
+				return False
+			client = self._client_create()
+			if False == client.connect():
+				client.close()
+				self.stats['connect_errors'] += 1
+				self.next_connect_time = time.monotonic() + self.reconnect_delay
+				self.reconnect_delay = min(self.reconnect_delay * 2, TRANSPORT_RECONNECT_MAX_DELAY)
+				return False
+			if isinstance(client, ModbusTcpClient) and client.socket is not None:
+				tcp_keepalive_set(client.socket)
+			self.client = client
+			self.stats['connects'] += 1
+			if True == self.closed_after_timeout:
+				self.stats['timeout_reconnects'] += 1 # Переподключение после закрытия сокета клиентом, а не разрыва канала
+				self.closed_after_timeout = False
+			self.reconnect_delay = TRANSPORT_RECONNECT_DELAY
+			self.next_connect_time = 0.0
+			self.last_used = time.monotonic()
+			return True
+
+	def close(self, after_timeout=False):
+		'''
+		Brief Закрытие соединения (следующая транзакция подключится заново) \n
+		Param[in] *after_timeout* True - сокет закрыт клиентом после отсутствия ответа устройства (канал исправен) \n
+		'''
+		with self.lock:
+			if self.client is not None:
+				self.client.close()
+				self.client = None
+			self.closed_after_timeout = after_timeout
+
+	def _slave_timeout(self, slave):
+		'''
+		Brief Учет отсутствия ответа устройства: после TRANSPORT_SLAVE_TIMEOUTS запросов подряд без ответа устройство \n
+		не опрашивается в течение паузы, удваиваемой после каждого следующего отсутствия ответа (до TRANSPORT_SLAVE_BACKOFF_MAX) \n
+		'''
+		self.slave_timeouts[slave] = self.slave_timeouts.get(slave, 0) + 1
+		if self.slave_timeouts[slave] >= TRANSPORT_SLAVE_TIMEOUTS:
+			backoff_delay = self.slave_backoff[slave][1] * 2 if slave in self.slave_backoff else TRANSPORT_SLAVE_BACKOFF
+			backoff_delay = min(backoff_delay, TRANSPORT_SLAVE_BACKOFF_MAX)
+			self.slave_backoff[slave] = [time.monotonic() + backoff_delay, backoff_delay]
+
+	def _execute(self, method_name, address, value, slave):
+		'''
+		Brief Выполнение транзакции. При разрыве соединения (ошибка подключения или сокета/порта) соединение \n
+		закрывается, восстанавливается и транзакция повторяется до TRANSPORT_RETRIES раз. Отсутствие ответа \n
+		одного устройства (ModbusIOException) и ответ с кодом ошибки ModBus возвращаются без повтора: остальные \n
+		устройства шины продолжают работать через то же соединение. Запрос к устройству, которое временно \n
+		не опрашивается (см. _slave_timeout), сразу возвращает ModbusIOException без обмена \n
+		'''
+		with self.lock:
+			if slave in self.slave_backoff and time.monotonic() < self.slave_backoff[slave][0]:
+				self.stats['slaves_skipped'] += 1
+				return ModbusIOException(self.key + ': slave ' + str(slave) + ' does not respond, next request in '
+					+ str(round(self.slave_backoff[slave][0] - time.monotonic(), 1)) + ' s')
+			for attempt_idx in range(TRANSPORT_RETRIES + 1):
+				if False == self.connect():
+					raise ConnectionException(self.key + ': not connected, next attempt in '
+						+ str(round(max(0, self.next_connect_time - time.monotonic()), 1)) + ' s')
+				self.stats['requests'] += 1
+				try:
+					response = getattr(self.client, method_name)(address, value, slave)
+				except (ConnectionException, OSError) as error:
+					link_error = error
+					self.stats['link_errors'] += 1
+					self.close()
+					continue
+				self.last_used = time.monotonic()
+				if isinstance(response, ModbusIOException):
+					self.stats['timeouts'] += 1
+					self._slave_timeout(slave)
+					# Клиент TCP pymodbus закрывает сокет после отсутствия ответа: следующая транзакция подключится
+					# через connect (с TCP keep-alive и паузой после ошибки). Последовательный порт остается открытым
+					if False == self.client.is_socket_open():
+						self.close(after_timeout=True)
+				else:
+					self.slave_timeouts.pop(slave, None)
+					self.slave_backoff.pop(slave, None)
+				return response
+			raise ConnectionException(self.key + ': ' + str(link_error))
+
+	def read_holding_registers(self, address, count, slave):
+		'''
+		Brief Чтение регистров (Read Holding Registers) \n
+		'''
+		return self._execute('read_holding_registers', address, count, slave)
+
+	def write_registers(self, address, values, slave):
+		'''
+		Brief Запись регистров (Write Multiple Registers) \n
+		'''
+		return self._execute('write_registers', address, values, slave)
+
+	def keep_alive(self, idle_period=TRANSPORT_KEEPALIVE_PERIOD):
+		'''
+		Brief Запрос keep-alive (чтение одного регистра 'keepalive_addr' устройства 'keepalive_slave'), если \n
+		соединение простаивает дольше idle_period. Без 'keepalive_slave' в настройках используется только TCP keep-alive \n
+		Return True - запрос выполнен \n
+		'''
+		if self.config.get('keepalive_slave') is None or time.monotonic() - self.last_used < idle_period:
+			return False
+		if False == self.lock.acquire(blocking=False):
+			return False # Соединение занято транзакцией
+		try:
+			if self.client is None:
+				return False
+			self.stats['keepalives'] += 1
+			self._execute('read_holding_registers', self.config.get('keepalive_addr', 0), 1, self.config['keepalive_slave'])
+			return True
+		except ConnectionException:
+			return False
+		finally:
+			self.lock.release()
+
+class TransportPool(object):
+	'''
+	Brief Пул постоянных соединений: одно соединение на адрес (порт, хост:порт), общее для всех устройств \n
+	'''
+	def __init__(self, keepalive_period=TRANSPORT_KEEPALIVE_PERIOD):
+		'''
+		Brief Создание пула \n
+		Param[in] *keepalive_period* время простоя соединения до запроса keep-alive, [s] \n
+		'''
+		self.keepalive_period = keepalive_period
+		self.connections = {}
+		self.lock = threading.Lock()
+		self.stop_event = threading.Event()
+		self.keepalive_thread = None
+
+	def get(self, config):
+		'''
+		Brief Соединение из пула (создается при первом обращении) \n
+		Param[in] *config* настройки соединения (см. transport_key) \n
+		Return Объект ModbusConnection \n
+		'''
+		with self.lock:
+			key = transport_key(config)
+			if key not in self.connections:
+				self.connections[key] = ModbusConnection(config)
+			return self.connections[key]
+
+	def keepalive_start(self):
+		'''
+		Brief Запуск фонового потока запросов keep-alive для простаивающих соединений \n
+		'''
+		if self.keepalive_thread is None:
+			self.keepalive_thread = threading.Thread(target=self._keepalive_run, name='modbus_keepalive', daemon=True)
+			self.keepalive_thread.start()
+
+	def _keepalive_run(self):
+		while False == self.stop_event.wait(self.keepalive_period / 4):
+			with self.lock:
+				connections = list(self.connections.values())
+			for connection in connections:
+				connection.keep_alive(self.keepalive_period)
+
+	def report(self):
+		'''
+		Brief Статистика соединений пула \n
+		Return Словарь {ключ соединения: статистика} \n
+		'''
+		with self.lock:
+			return {key: dict(connection.stats) for key, connection in self.connections.items()}
+
+	def close(self):
+		'''
+		Brief Остановка потока keep-alive и закрытие всех соединений \n
+		'''
+		self.stop_event.set()
+		if self.keepalive_thread is not None:
+			self.keepalive_thread.join()
+			self.keepalive_thread = None
+		with self.lock:
+			for connection in self.connections.values():
+				connection.close()
+			self.connections = {}
+
+# Общий пул соединений программы
+transport_pool = TransportPool()
+
+def connection_get(config):
+	'''
+	Brief Подключенное соединение из общего пула (с запуском потока keep-alive) \n
+	Param[in] *config* настройки соединения (см. transport_key) \n
+	Return Объект ModbusConnection \n
+	'''
+	connection = transport_pool.get(config)
+	connection.connect()
+	transport_pool.keepalive_start()
+	return connection
@@ -0,0 +1,144 @@
+'''
+## Проверка транспорта ModBus (modbus_transport) на локальном сервере pymodbus
+###### Сервер ModBus TCP запускается в отдельном потоке с форматом кадра TCP и RTU (RTU поверх TCP). Проверяются:
+###### постоянное соединение из пула, отсутствие ответа устройства (клиент TCP pymodbus закрывает сокет - одно
+###### переподключение) и пауза опроса не отвечающего устройства, ответ с кодом ошибки, восстановление соединения
+###### после перезапуска сервера и запрос keep-alive. Код завершения 1 - есть ошибки.
+'''
+import asyncio, logging, sys, threading, time
+from pymodbus.datastore import ModbusSequentialDataBlock, ModbusServerContext, ModbusSlaveContext
+from pymodbus.framer import ModbusRtuFramer, ModbusSocketFramer
+from pymodbus.server import ServerAsyncStop, StartAsyncTcpServer
+import modbus_transport
+
+CHECK_HOST = '127.0.0.1'
+CHECK_PORT = 15020 # Первый TCP порт сервера (для каждого формата кадра - следующий)
+CHECK_SLAVE_ID = 42 # Адрес устройства на сервере
+CHECK_MISSING_SLAVE_ID = 43 # Адрес устройства, которого нет на сервере (нет ответа)
+CHECK_REGS_COUNT = 24300 # Кол-во регистров сервера (включая область данных ADC SD 12000..24299)
+CHECK_TIMEOUT = 0.5 # [s] Время ожидания ответа
+
+class ServerThread(object):
+	'''
+	Brief Сервер ModBus TCP pymodbus в отдельном потоке с собственным циклом событий \n
+	'''
+	def __init__(self, port, framer):
+		'''
+		Brief Запуск сервера \n
+		Param[in] *port* TCP порт \n
+		Param[in] *framer* формат кадра (ModbusSocketFramer - ModBus TCP, ModbusRtuFramer - RTU поверх TCP) \n
+		'''
+		# Значение регистра - его адрес (хранилище pymodbus смещено на один регистр)
+		server_block = ModbusSequentialDataBlock(0, list(range(-1, CHECK_REGS_COUNT - 1)))
+		self.context = ModbusServerContext(slaves={CHECK_SLAVE_ID: ModbusSlaveContext(hr=server_block)}, single=False)
+		self.loop = asyncio.new_event_loop()
+		self.thread = threading.Thread(target=self._run, args=(port, framer), daemon=True)
+		self.thread.start()
+		time.sleep(0.5)
+
+	def _run(self, port, framer):
+		asyncio.set_event_loop(self.loop)
+		# Запросы к отсутствующему устройству остаются без ответа, как на шине RS-485
+		self.loop.create_task(StartAsyncTcpServer(context=self.context, address=(CHECK_HOST, port), framer=framer,
+			ignore_missing_slaves=True))
+		self.loop.run_forever()
+
+	def stop(self):
+		'''
+		Brief Остановка сервера (соединения клиентов разрываются) \n
+		'''
+		asyncio.run_coroutine_threadsafe(ServerAsyncStop(), self.loop).result(5)
+		self.loop.call_soon_threadsafe(self.loop.stop)
+		self.thread.join(5)
+
+def transport_check(transport, port, framer):
+	'''
+	Brief Проверка соединения одного вида транспорта \n
+	Param[in] *transport* вид транспорта ('tcp', 'rtu_over_tcp') \n
+	Param[in] *port* TCP порт сервера \n
+	Param[in] *framer* формат кадра сервера \n
+	Return Список результатов: (название проверки, True - успешно, подробности) \n
+	'''
+	check_results = []
+	config = {'transport': transport, 'host': CHECK_HOST, 'port': port, 'timeout': CHECK_TIMEOUT, 'keepalive_slave': CHECK_SLAVE_ID}
+	server = ServerThread(port, framer)
+	try:
+		connection = modbus_transport.connection_get(config)
+		# Пул: повторный запрос соединения возвращает тот же объект, все транзакции - через одно подключение
+		responses = [connection.read_holding_registers(reg_addr, 13, CHECK_SLAVE_ID) for reg_addr in range(0, 1000, 10)]
+		check_results.append(('pool', modbus_transport.connection_get(config) is connection and 1 == connection.stats['connects']
+			and all(response.registers[0] == reg_addr for response, reg_addr in zip(responses, range(0, 1000, 10))), dict(connection.stats)))
+
+		# Нет ответа устройства: ошибка возвращается без повтора. Клиент pymodbus закрывает сокет после отсутствия ответа,
+		# следующая транзакция с другим устройством успешна после одного переподключения (не ошибка канала)
+		stats_before = dict(connection.stats)
+		response = connection.read_holding_registers(0, 1, CHECK_MISSING_SLAVE_ID)
+		next_response = connection.read_holding_registers(5, 1, CHECK_SLAVE_ID)
+		check_results.append(('slave_timeout', True == response.isError() and stats_before['requests'] + 2 == connection.stats['requests']
+			and stats_before['connects'] + 1 == connection.stats['connects'] and stats_before['timeout_reconnects'] + 1 == connection.stats['timeout_reconnects']
+			and 0 == connection.stats['link_errors'] and [5] == next_response.registers, dict(connection.stats)))
+
+		# Пауза опроса не отвечающего устройства: после TRANSPORT_SLAVE_TIMEOUTS запросов подряд без ответа запросы
+		# к нему возвращают ошибку без обмена и без переподключения, остальные устройства опрашиваются
+		for request_idx in range(modbus_transport.TRANSPORT_SLAVE_TIMEOUTS - 1):
+			connection.read_holding_registers(0, 1, CHECK_MISSING_SLAVE_ID)
+		stats_before = dict(connection.stats)
+		responses = [connection.read_holding_registers(0, 1, CHECK_MISSING_SLAVE_ID) for request_idx in range(10)]
+		next_response = connection.read_holding_registers(5, 1, CHECK_SLAVE_ID)
+		check_results.append(('slave_backoff', all(True == response.isError() for response in responses)
+			and stats_before['requests'] + 1 == connection.stats['requests'] and stats_before['slaves_skipped'] + 10 == connection.stats['slaves_skipped']
+			and stats_before['connects'] + 1 == connection.stats['connects'] and [5] == next_response.registers, dict(connection.stats)))
+
+		# По истечении паузы устройство запрашивается один раз, при отсутствии ответа пауза удваивается
+		backoff_delay = connection.slave_backoff[CHECK_MISSING_SLAVE_ID][1]
+		connection.slave_backoff[CHECK_MISSING_SLAVE_ID][0] = 0.0
+		stats_before = dict(connection.stats)
+		responses = [connection.read_holding_registers(0, 1, CHECK_MISSING_SLAVE_ID) for request_idx in range(3)]
+		next_response = connection.read_holding_registers(5, 1, CHECK_SLAVE_ID)
+		check_results.append(('slave_backoff_probe', all(True == response.isError() for response in responses)
+			and stats_before['requests'] + 2 == connection.stats['requests'] and stats_before['slaves_skipped'] + 2 == connection.stats['slaves_skipped']
+			and 2 * backoff_delay == connection.slave_backoff[CHECK_MISSING_SLAVE_ID][1] and [5] == next_response.registers, dict(connection.stats)))
+
+		# Ответ с кодом ошибки ModBus (недопустимый адрес) возвращается без переподключения
+		connects_count = connection.stats['connects']
+		response = connection.read_holding_registers(CHECK_REGS_COUNT + 100, 1, CHECK_SLAVE_ID)
+		check_results.append(('exception_response', True == response.isError() and connects_count == connection.stats['connects'],
+			dict(connection.stats)))
+
+		# Keep-alive простаивающего соединения
+		connection.last_used -= 2 * modbus_transport.TRANSPORT_KEEPALIVE_PERIOD
+		check_results.append(('keepalive', True == connection.keep_alive() and connection.stats['keepalives'] > 0, dict(connection.stats)))
+
+		# Перезапуск сервера: соединение восстанавливается
+		server.stop()
+		try:
+			connection.read_holding_registers(0, 1, CHECK_SLAVE_ID)
+		except modbus_transport.ConnectionException:
+			pass
+		server = ServerThread(port, framer)
+		time.sleep(modbus_transport.TRANSPORT_RECONNECT_DELAY)
+		response = connection.read_holding_registers(7, 1, CHECK_SLAVE_ID)
+		check_results.append(('reconnect', False == response.isError() and [7] == response.registers, dict(connection.stats)))
+	except Exception as check_error:
+		check_results.append(('error', False, repr(check_error)))
+	finally:
+		server.stop()
+	return check_results
+
+def main():
+	''' #MAIN
+	Brief Проверка транспорта ModBus TCP и RTU поверх TCP \n
+	Return True - все проверки успешны \n
+	'''
+	logging.disable(logging.CRITICAL)
+	modbus_transport.TRANSPORT_RECONNECT_DELAY = 0.2
+	check_ok = True
+	for port_idx, (transport, framer) in enumerate([('tcp', ModbusSocketFramer), ('rtu_over_tcp', ModbusRtuFramer)]):
+		for check_name, check_result, check_details in transport_check(transport, CHECK_PORT + port_idx, framer):
+			print(transport, ':: ', check_name, ':: ', 'OK' if True == check_result else 'FAIL', ':: ', check_details)
+			check_ok = check_ok and check_result
+	modbus_transport.transport_pool.close()
+	return check_ok
+
+if __name__ == '__main__':
+	sys.exit(0 if True == main() else 1)
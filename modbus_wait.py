@@ -0,0 +1,114 @@
+'''
+## Ожидание готовности устройства после команды (например, чтения данных с SD карты в RAM-буфер)
+###### Бит статуса опрашивается с экспоненциально растущим интервалом до заданного предельного времени.
+###### Время выполнения команды запоминается: первый опрос выполняется через типичное время выполнения,
+###### поэтому быстрая карта не ждет лишнего, а медленная не дает ошибку из-за единственного опроса.
+'''
+import collections, time
+import numpy as np
+
+WAIT_MIN_POLL = 0.005 # [s] Минимальный интервал опроса
+WAIT_MAX_POLL = 0.2 # [s] Максимальный интервал опроса
+WAIT_BACKOFF = 2 # Множитель интервала опроса после каждого неудачного опроса
+WAIT_TIMEOUT = 2.0 # [s] Предельное время ожидания
+WAIT_HISTORY_SIZE = 32 # Кол-во запоминаемых значений времени выполнения команды
+WAIT_FIRST_POLL_QUANTILE = 0.5 # Квантиль времени выполнения, через которое выполняется первый опрос
+WAIT_ADAPT_DOWN = 0.9 # Множитель оценки времени выполнения, если команда выполнена к первому опросу
+WAIT_ADAPT_UP = 1.1 # Множитель времени последнего опроса с битом занятости для оценки времени выполнения
+
+class ReadyWaiter(object):
+	'''
+	Brief Ожидание сброса бита занятости в слове статуса с запоминанием времени выполнения команды \n
+	'''
+	def __init__(self, first_poll, timeout=WAIT_TIMEOUT, min_poll=WAIT_MIN_POLL, max_poll=WAIT_MAX_POLL, backoff=WAIT_BACKOFF):
+		'''
+		Brief Создание объекта ожидания \n
+		Param[in] *first_poll* задержка первого опроса, пока нет статистики времени выполнения, [s] \n
+		Param[in] *timeout* предельное время ожидания, [s] \n
+		Param[in] *min_poll* минимальный интервал опроса, [s] \n
+		Param[in] *max_poll* максимальный интервал опроса, [s] \n
+		Param[in] *backoff* множитель интервала опроса после каждого неудачного опроса \n
+		'''
+		self.default_first_poll = first_poll
+		self.timeout = timeout
+		self.min_poll = min_poll
+		self.max_poll = max_poll
+		self.backoff = backoff
+		self.ready_times = collections.deque(maxlen=WAIT_HISTORY_SIZE)
+		self.timeout_count = 0
+		self.error_count = 0
+
+	def first_poll(self):
+		'''
+		Brief Задержка первого опроса: типичное время выполнения команды по сохраненной статистике \n
+		Return Задержка, [s] \n
+		'''
+		if 0 == len(self.ready_times):
+			return self.default_first_poll
+		first_poll = float(np.quantile(self.ready_times, WAIT_FIRST_POLL_QUANTILE))
+		return min(max(first_poll, self.min_poll), self.max_poll)
+
+	def _poll_delays(self):
+		'''
+		Brief Последовательность задержек перед опросами: первая задержка, затем экспоненциально растущий интервал \n
+		от минимального (команда вот-вот завершится, если не завершилась к типичному времени) \n
+		'''
+		yield self.first_poll()
+		poll_delay = self.min_poll
+		while True:
+			yield poll_delay
+			poll_delay = min(poll_delay * self.backoff, self.max_poll)
+
+	def _result(self, status, start_time, busy_time):
+		'''
+		Brief Запоминание оценки времени выполнения команды и формирование результата ожидания. Истинное время \n
+		выполнения лежит между последним опросом с битом занятости (busy_time) и опросом без него: если команда \n
+		выполнена к первому опросу, запоминается немного уменьшенное время, иначе - немного больше busy_time, \n
+		поэтому задержка первого опроса сходится к времени выполнения и в обе стороны \n
+		'''
+		elapsed_time = time.perf_counter() - start_time
+		if status is None:
+			self.timeout_count += 1
+		elif busy_time is None:
+			self.ready_times.append(max(elapsed_time * WAIT_ADAPT_DOWN, self.min_poll))
+		else:
+			self.ready_times.append(min(busy_time * WAIT_ADAPT_UP, self.timeout))
+		return status, elapsed_time
+
+	def wait(self, read_status, busy_mask):
+		'''
+		Brief Ожидание сброса бита занятости \n
+		Param[in] *read_status* функция чтения слова статуса (None - ошибка чтения) \n
+		Param[in] *busy_mask* маска бита занятости (например, MODBUS_STATUS_SD_ADC) \n
+		Return Слово статуса после сброса бита занятости (None - предельное время истекло или ошибка чтения) и время ожидания, [s] \n
+		'''
+		start_time = time.perf_counter()
+		deadline = start_time + self.timeout
+		busy_time = None
+		for poll_delay in self._poll_delays():
+			time.sleep(max(0, min(poll_delay, deadline - time.perf_counter())))
+			status = read_status()
+			if status is None:
+				self.error_count += 1
+				return None, time.perf_counter() - start_time
+			if 0 == (status & busy_mask):
+				return self._result(status, start_time, busy_time)
+			busy_time = time.perf_counter() - start_time
+			if busy_time >= self.timeout:
+				return self._result(None, start_time, busy_time)
+
+	def report(self):
+		'''
+		Brief Статистика времени выполнения команды \n
+		Return Словарь: кол-во измерений, мин., медиана, макс. время [s], задержка первого опроса [s], кол-во превышений предельного времени и ошибок чтения статуса \n
+		'''
+		ready_times = np.array(self.ready_times) if len(self.ready_times) > 0 else np.zeros(1) + np.nan
+		return {
+			'count': len(self.ready_times),
+			'min_s': float(np.min(ready_times)),
+			'median_s': float(np.median(ready_times)),
+			'max_s': float(np.max(ready_times)),
+			'first_poll_s': self.first_poll(),
+			'timeouts': self.timeout_count,
+			'errors': self.error_count,
+		}
@@ -0,0 +1,275 @@
+'''
+## Архив данных SD карты: декодированные отсчеты АЦП, индекс меток времени фреймов и таблица данных диагностики
+###### Отсчеты каждого канала хранятся в файлах NPY фиксированного размера (ARCHIVE_CHUNK_FRAMES фреймов), фрейм архива
+###### с номером n находится в порции n // ARCHIVE_CHUNK_FRAMES. Запрос интервала времени выполняется двоичным поиском
+###### по индексу и срезом отображенных в память порций (np.load с mmap_mode), без повторного разбора файлов SD карты.
+###### Сеансы записи добавляются в архив по порядку времени.
+'''
+import os
+from datetime import datetime
+import numpy as np
+import adc_parse, diag_parse, fattime, sd_export, time_sequence
+
+ARCHIVE_CHUNK_FRAMES = 1800 # Кол-во фреймов АЦП в одной порции (один час, 14.7 MB на канал)
+ARCHIVE_INDEX_FILE = 'index.npy' # Индекс фреймов АЦП: метки времени и статус CRC каналов
+ARCHIVE_DIAG_FILE = 'diag.npy' # Таблица данных диагностики
+ARCHIVE_CHUNK_FILE = 'ch{0}_{1:06d}.npy' # Файл порции отсчетов: номер канала, номер порции
+ARCHIVE_CHANNEL_COUNT = len(adc_parse.ADC_FILENAMES)
+
+archive_index_dtype = np.dtype([
+	('time', '<i8'),                                # Метка времени, секунды от 1970-01-01
+	('fat_time', '<u4'),                            # Метка времени FAT_TIME из файла
+	('crc_ok', '?', (ARCHIVE_CHANNEL_COUNT,)),      # Результат проверки CRC фрейма каждого канала
+])
+
+archive_diag_dtype = np.dtype([
+	('time', '<i8'),
+	('fat_time', '<u4'),
+	('inp_voltage', '<u2', (diag_parse.VOLTAGE_POINTS_COUNT,)),
+	('hum_int', '<u2'),
+	('temp_int', '<i2'),
+	('hum_ext', '<u2'),
+	('temp_ext', '<i2'),
+	('crc_ok', '?'),
+])
+
+def time_to_seconds(date_time):
+	'''
+	Brief Метка времени в секундах от 1970-01-01 \n
+	Param[in] *date_time* datetime, numpy.datetime64 или секунды \n
+	Return Кол-во секунд int \n
+	'''
+	if isinstance(date_time, (datetime, np.datetime64)):
+		return int(np.datetime64(date_time, 's').astype(np.int64))
+	return int(date_time)
+
+def frames_ascending(frame_seconds, last_seconds):
+	'''
+	Brief Отбор фреймов, метка которых позже меток всех предыдущих фреймов (индекс архива должен возрастать) \n
+	Param[in] *frame_seconds* метки времени фреймов, секунды от 1970-01-01 \n
+	Param[in] *last_seconds* метка последнего фрейма архива (None - архив пуст) \n
+	Return Массив bool: True - фрейм добавляется в архив \n
+	'''
+	if 0 == len(frame_seconds):
+		return np.zeros(0, dtype=bool)
+	previous_max = np.maximum.accumulate(np.concatenate((
+		[np.iinfo(np.int64).min if last_seconds is None else last_seconds], frame_seconds[:-1])))
+	return frame_seconds > previous_max
+
+class SdArchive(object):
+	'''
+	Brief Архив декодированных данных SD карты в каталоге \n
+	'''
+	def __init__(self, archive_dir):
+		'''
+		Brief Открытие архива, каталог создается при необходимости \n
+		Param[in] *archive_dir* каталог архива \n
+		'''
+		self.archive_dir = archive_dir
+		os.makedirs(archive_dir, exist_ok=True)
+		self.index = self._table_load(ARCHIVE_INDEX_FILE, archive_index_dtype)
+		self.diag = self._table_load(ARCHIVE_DIAG_FILE, archive_diag_dtype)
+		self._chunks = {}
+
+	def _table_load(self, file_name, table_dtype):
+		'''
+		Brief Чтение таблицы архива (пустая таблица, если файла нет) \n
+		'''
+		file_path = os.path.join(self.archive_dir, file_name)
+		if False == os.path.exists(file_path):
+			return np.zeros(0, dtype=table_dtype)
+		return np.load(file_path)
+
+	def _table_save(self, file_name, table):
+		'''
+		Brief Запись таблицы архива через временный файл: при сбое остается предыдущая версия \n
+		'''
+		file_path = os.path.join(self.archive_dir, file_name)
+		with open(file_path + '.tmp', 'wb') as table_file:
+			np.save(table_file, table)
+		os.replace(file_path + '.tmp', file_path)
+
+	def _chunk_path(self, channel_idx, chunk_idx):
+		return os.path.join(self.archive_dir, ARCHIVE_CHUNK_FILE.format(channel_idx, chunk_idx))
+
+	def _chunk(self, channel_idx, chunk_idx):
+		'''
+		Brief Порция отсчетов канала, отображенная в память только для чтения \n
+		Param[in] *channel_idx* номер канала \n
+		Param[in] *chunk_idx* номер порции \n
+		Return Массив int32 (ARCHIVE_CHUNK_FRAMES, ADC_SAMPLE_NUMBER) \n
+		'''
+		chunk_key = (channel_idx, chunk_idx)
+		if chunk_key not in self._chunks:
+			self._chunks[chunk_key] = np.load(self._chunk_path(channel_idx, chunk_idx), mmap_mode='r')
+		return self._chunks[chunk_key]
+
+	def _samples_write(self, channel_idx, archive_frame_start, samples):
+		'''
+		Brief Запись отсчетов фреймов канала в порции архива, начиная с заданного номера фрейма архива \n
+		Param[in] *channel_idx* номер канала \n
+		Param[in] *archive_frame_start* номер фрейма архива для первого записываемого фрейма \n
+		Param[in] *samples* отсчеты АЦП int32 (кол-во фреймов, ADC_SAMPLE_NUMBER) \n
+		'''
+		frame_idx = 0
+		while frame_idx < len(samples):
+			chunk_idx, chunk_row = divmod(archive_frame_start + frame_idx, ARCHIVE_CHUNK_FRAMES)
+			row_count = min(len(samples) - frame_idx, ARCHIVE_CHUNK_FRAMES - chunk_row)
+			chunk_path = self._chunk_path(channel_idx, chunk_idx)
+			# Порция создается сразу полного размера, поэтому фреймы следующих сеансов дописываются на место
+			if True == os.path.exists(chunk_path):
+				chunk = np.lib.format.open_memmap(chunk_path, mode='r+')
+			else:
+				chunk = np.lib.format.open_memmap(chunk_path, mode='w+', dtype=np.int32,
+					shape=(ARCHIVE_CHUNK_FRAMES, adc_parse.ADC_SAMPLE_NUMBER))
+			chunk[chunk_row:chunk_row + row_count] = samples[frame_idx:frame_idx + row_count]
+			chunk.flush()
+			del chunk
+			self._chunks.pop((channel_idx, chunk_idx), None)
+			frame_idx += row_count
+
+	def ingest(self, session_dir, adc_filenames=adc_parse.ADC_FILENAMES, diag_filename=diag_parse.DIAG_FILENAME):
+		'''
+		Brief Добавление в архив сеанса записи: разбор и проверка CRC файлов каналов АЦП и диагностики. \n
+		Фреймы, метка времени которых не позже уже добавленных, пропускаются \n
+		Param[in] *session_dir* каталог с файлами сеанса \n
+		Param[in] *adc_filenames* имена файлов каналов АЦП \n
+		Param[in] *diag_filename* имя файла диагностики (файла может не быть) \n
+		Return Словарь: кол-во добавленных и пропущенных фреймов АЦП и диагностики \n
+		'''
+		ingest_report = {
+			'adc_frames': 0,
+			'adc_skipped_frames': 0,
+			'diag_frames': 0,
+			'diag_skipped_frames': 0,
+		}
+		adc_paths = [os.path.join(session_dir, file_name) for file_name in adc_filenames]
+		# Фреймы каналов сопоставляются по номеру, время фреймов берется из файла первого канала
+		adc_files = [adc_parse.adc_file_open(adc_path) for adc_path in adc_paths]
+		frame_count = min(len(adc_file) for adc_file in adc_files)
+		frame_time = adc_files[0].frames(0, frame_count)['time'].copy()
+		for adc_file in adc_files:
+			adc_file.close()
+		frame_seconds = fattime.convert_to_seconds_array(frame_time)
+		frame_keep = frames_ascending(frame_seconds, int(self.index['time'][-1]) if len(self.index) > 0 else None)
+
+		session_index = np.zeros(np.count_nonzero(frame_keep), dtype=archive_index_dtype)
+		session_index['time'] = frame_seconds[frame_keep]
+		session_index['fat_time'] = frame_time[frame_keep]
+		for channel_idx, adc_path in enumerate(adc_paths):
+			session_frame_idx = 0
+			for adc_chunk in adc_parse.adc_frames_iter(adc_path, 0, frame_count):
+				chunk_keep = frame_keep[adc_chunk['frame_idx']:adc_chunk['frame_idx'] + len(adc_chunk['crc_ok'])]
+				chunk_samples = adc_chunk['samples'].reshape(-1, adc_parse.ADC_SAMPLE_NUMBER)[chunk_keep]
+				self._samples_write(channel_idx, len(self.index) + session_frame_idx, chunk_samples)
+				session_index['crc_ok'][session_frame_idx:session_frame_idx + len(chunk_samples), channel_idx] = adc_chunk['crc_ok'][chunk_keep]
+				session_frame_idx += len(chunk_samples)
+		# Индекс записывается последним: при сбое во время записи порций архив остается в прежнем состоянии
+		self.index = np.concatenate((self.index, session_index))
+		self._table_save(ARCHIVE_INDEX_FILE, self.index)
+		ingest_report['adc_frames'] = len(session_index)
+		ingest_report['adc_skipped_frames'] = frame_count - len(session_index)
+
+		diag_path = os.path.join(session_dir, diag_filename)
+		if True == os.path.exists(diag_path):
+			with diag_parse.diag_file_open(diag_path) as diag_file:
+				diag_frames = diag_file.frames()
+				diag_seconds = fattime.convert_to_seconds_array(diag_frames['time'])
+				diag_keep = frames_ascending(diag_seconds, int(self.diag['time'][-1]) if len(self.diag) > 0 else None)
+				session_diag = np.zeros(np.count_nonzero(diag_keep), dtype=archive_diag_dtype)
+				session_diag['time'] = diag_seconds[diag_keep]
+				session_diag['fat_time'] = diag_frames['time'][diag_keep]
+				for field_name in ['inp_voltage', 'hum_int', 'temp_int', 'hum_ext', 'temp_ext']:
+					session_diag[field_name] = diag_frames[field_name][diag_keep]
+				session_diag['crc_ok'] = (diag_parse.diag_frames_crc(diag_frames) == diag_frames['crc'])[diag_keep]
+				ingest_report['diag_skipped_frames'] = len(diag_frames) - len(session_diag)
+				del diag_frames
+			self.diag = np.concatenate((self.diag, session_diag))
+			self._table_save(ARCHIVE_DIAG_FILE, self.diag)
+			ingest_report['diag_frames'] = len(session_diag)
+		return ingest_report
+
+	def frames_find(self, time_start, time_stop):
+		'''
+		Brief Поиск фреймов архива в интервале времени двоичным поиском по индексу \n
+		Param[in] *time_start* начало интервала: datetime, numpy.datetime64 или секунды от 1970-01-01 \n
+		Param[in] *time_stop* конец интервала (включительно) \n
+		Return Номер первого фрейма и номер фрейма после последнего \n
+		'''
+		frame_start = int(np.searchsorted(self.index['time'], time_to_seconds(time_start), side='left'))
+		frame_stop = int(np.searchsorted(self.index['time'], time_to_seconds(time_stop), side='right'))
+		return frame_start, max(frame_start, frame_stop)
+
+	def samples(self, channel, frame_start, frame_stop):
+		'''
+		Brief Отсчеты канала для диапазона фреймов архива. В пределах одной порции возвращается \n
+		представление отображенного в память файла без копирования \n
+		Param[in] *channel* номер канала или имя столбца (см. sd_export.ADC_COLUMN_NAMES) \n
+		Param[in] *frame_start* номер первого фрейма \n
+		Param[in] *frame_stop* номер фрейма после последнего \n
+		Return Массив отсчетов АЦП int32, ADC_SAMPLE_NUMBER отсчетов на каждый фрейм \n
+		'''
+		if isinstance(channel, str):
+			channel = sd_export.ADC_COLUMN_NAMES.index(channel)
+		chunk_samples = []
+		frame_idx = frame_start
+		while frame_idx < frame_stop:
+			chunk_idx, chunk_row = divmod(frame_idx, ARCHIVE_CHUNK_FRAMES)
+			row_count = min(frame_stop - frame_idx, ARCHIVE_CHUNK_FRAMES - chunk_row)
+			chunk_samples.append(self._chunk(channel, chunk_idx)[chunk_row:chunk_row + row_count].reshape(-1))
+			frame_idx += row_count
+		if 0 == len(chunk_samples):
+			return np.zeros(0, dtype=np.int32)
+		if 1 == len(chunk_samples):
+			return chunk_samples[0]
+		return np.concatenate(chunk_samples)
+
+	def adc_slice(self, channel, time_start, time_stop):
+		'''
+		Brief Данные канала АЦП за интервал времени \n
+		Param[in] *channel* номер канала или имя столбца (см. sd_export.ADC_COLUMN_NAMES) \n
+		Param[in] *time_start* начало интервала: datetime, numpy.datetime64 или секунды от 1970-01-01 \n
+		Param[in] *time_stop* конец интервала (включительно) \n
+		Return Словарь: номер первого фрейма архива, метки времени фреймов (datetime64), \n
+		отсчеты АЦП int32, статус CRC фреймов, пропуски данных (см. time_sequence.find_time_gaps) \n
+		'''
+		if isinstance(channel, str):
+			channel = sd_export.ADC_COLUMN_NAMES.index(channel)
+		frame_start, frame_stop = self.frames_find(time_start, time_stop)
+		frame_seconds = self.index['time'][frame_start:frame_stop]
+		time_gaps = time_sequence.find_time_gaps(time_to_seconds(time_start), frame_seconds, time_to_seconds(time_stop))
+		for gap in time_gaps:
+			gap['frame_idx'] += frame_start
+		return {
+			'frame_idx': frame_start,
+			'frame_time': frame_seconds.astype('datetime64[s]'),
+			'samples': self.samples(channel, frame_start, frame_stop),
+			'crc_ok': self.index['crc_ok'][frame_start:frame_stop, channel],
+			'gaps': time_gaps,
+		}
+
+	def diag_slice(self, time_start, time_stop):
+		'''
+		Brief Данные диагностики за интервал времени \n
+		Param[in] *time_start* начало интервала: datetime, numpy.datetime64 или секунды от 1970-01-01 \n
+		Param[in] *time_stop* конец интервала (включительно) \n
+		Return Массив строк таблицы диагностики (archive_diag_dtype) \n
+		'''
+		row_start = np.searchsorted(self.diag['time'], time_to_seconds(time_start), side='left')
+		row_stop = np.searchsorted(self.diag['time'], time_to_seconds(time_stop), side='right')
+		return self.diag[row_start:max(row_start, row_stop)]
+
+	def close(self):
+		'''
+		Brief Освобождение отображенных в память порций \n
+		'''
+		self._chunks = {}
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
+
+if __name__ == '__main__':
+	print(SdArchive('archive').ingest('.'))
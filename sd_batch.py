@@ -0,0 +1,187 @@
+'''
+## Пакетная проверка сеансов записи SD карты: поиск каталогов сеансов, проверка CRC и меток времени всех файлов
+###### в пуле процессов и сводный отчет по всем сеансам. Результат каждого проверенного сеанса сразу дописывается
+###### в журнал, поэтому прерванная обработка при повторном запуске продолжается с непроверенных сеансов.
+'''
+import json, os, sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+import adc_parse, diag_parse, fattime, sd_index
+
+BATCH_WORKERS = None # Кол-во процессов (None - по числу ядер процессора)
+BATCH_JOURNAL_FILE = 'batch_journal.jsonl' # Журнал проверенных сеансов, по строке JSON на сеанс (в корневом каталоге)
+BATCH_REPORT_FILE = 'batch_report.json' # Сводный отчет по всем сеансам (в корневом каталоге)
+USE_INDEX_CACHE = True # Сохранять результаты проверки в индексные файлы рядом с файлами данных (см. sd_index)
+
+# Файлы сеанса записи: функция проверки всех фреймов и размер фрейма
+session_files = {file_name: (adc_parse.adc_index_build, adc_parse.ADC_FRAME_SIZE) for file_name in adc_parse.ADC_FILENAMES}
+session_files[diag_parse.DIAG_FILENAME] = (diag_parse.diag_index_build, diag_parse.DIAG_FRAME_SIZE)
+
+def sessions_find(root_dir):
+	'''
+	Brief Поиск каталогов сеансов записи: каталогов, в которых есть хотя бы один файл данных \n
+	Param[in] *root_dir* корневой каталог (например, корень SD карты) \n
+	Return Отсортированный список путей каталогов сеансов \n
+	'''
+	session_dirs = []
+	for dir_path, dir_names, file_names in os.walk(root_dir):
+		dir_names.sort()
+		if any(file_name in session_files for file_name in file_names):
+			session_dirs.append(dir_path)
+	return sorted(session_dirs)
+
+def session_signature(session_dir):
+	'''
+	Brief Признаки изменения файлов сеанса: размер и время изменения каждого файла данных \n
+	Param[in] *session_dir* каталог сеанса \n
+	Return Словарь {имя файла: [размер, время изменения]} \n
+	'''
+	signature = {}
+	for file_name in session_files:
+		file_path = os.path.join(session_dir, file_name)
+		if True == os.path.exists(file_path):
+			file_stat = os.stat(file_path)
+			signature[file_name] = [file_stat.st_size, file_stat.st_mtime_ns]
+	return signature
+
+def file_validate(file_path, index_build, frame_size):
+	'''
+	Brief Проверка CRC и последовательности меток времени всех фреймов файла (выполняется в отдельном процессе) \n
+	Param[in] *file_path* путь файла данных \n
+	Param[in] *index_build* функция проверки фреймов (построения индекса) по имени файла \n
+	Param[in] *frame_size* размер фрейма в файле, байт \n
+	Return Словарь: кол-во фреймов, номера фреймов с ошибкой CRC и времени, первая и последняя метки времени, \n
+	кол-во байт неполного фрейма в конце файла, текст ошибки чтения \n
+	'''
+	file_report = {
+		'frames': 0,
+		'crc_err_frames': [],
+		'time_err_frames': [],
+		'time_start': None,
+		'time_stop': None,
+		'tail_bytes': 0,
+		'error': None,
+	}
+	try:
+		file_report['tail_bytes'] = os.path.getsize(file_path) % frame_size
+		if True == USE_INDEX_CACHE:
+			frame_index = sd_index.index_get(file_path, index_build)
+		else:
+			frame_index = index_build(file_path)
+		file_report['frames'] = len(frame_index['frame_time'])
+		file_report['crc_err_frames'], file_report['time_err_frames'] = sd_index.index_errors(frame_index, 0, file_report['frames'])
+		if file_report['frames'] > 0:
+			file_report['time_start'] = fattime.convert_to_datetime(frame_index['frame_time'][0]).isoformat()
+			file_report['time_stop'] = fattime.convert_to_datetime(frame_index['frame_time'][-1]).isoformat()
+	except Exception as validate_error:
+		file_report['error'] = repr(validate_error)
+	return file_report
+
+def session_report_create(session_dir, root_dir, file_reports):
+	'''
+	Brief Отчет проверки сеанса по отчетам проверки его файлов \n
+	Param[in] *session_dir* каталог сеанса \n
+	Param[in] *root_dir* корневой каталог \n
+	Param[in] *file_reports* словарь {имя файла: отчет file_validate} \n
+	Return Словарь отчета сеанса \n
+	'''
+	return {
+		'session': os.path.relpath(session_dir, root_dir),
+		'signature': session_signature(session_dir),
+		'missing_files': [file_name for file_name in session_files if file_name not in file_reports],
+		'crc_ok': all(0 == len(file_report['crc_err_frames']) for file_report in file_reports.values()),
+		'time_sequence': all(0 == len(file_report['time_err_frames']) for file_report in file_reports.values()),
+		'errors': any(file_report['error'] is not None for file_report in file_reports.values()),
+		'files': file_reports,
+	}
+
+def journal_load(journal_path):
+	'''
+	Brief Чтение журнала проверенных сеансов. Неполная последняя строка (прерванная запись) пропускается \n
+	Param[in] *journal_path* путь файла журнала \n
+	Return Словарь {каталог сеанса: отчет сеанса}, для повторно проверенных сеансов - последний отчет \n
+	'''
+	session_reports = {}
+	if False == os.path.exists(journal_path):
+		return session_reports
+	with open(journal_path, 'r') as journal_file:
+		for journal_line in journal_file:
+			try:
+				session_report = json.loads(journal_line)
+			except ValueError:
+				continue
+			session_reports[session_report['session']] = session_report
+	return session_reports
+
+def main(root_dir='.'):
+	''' #MAIN
+	Brief Проверка всех сеансов записи в корневом каталоге и запись сводного отчета \n
+	Param[in] *root_dir* корневой каталог (например, корень SD карты) \n
+	Return Сводный отчет: отчеты сеансов и итоговые значения \n
+	'''
+	start_datetime = datetime.now()
+	journal_path = os.path.join(root_dir, BATCH_JOURNAL_FILE)
+	journal_reports = journal_load(journal_path)
+	session_dirs = sessions_find(root_dir)
+	# Сеансы из журнала проверяются повторно, только если изменились их файлы
+	pending_dirs = [session_dir for session_dir in session_dirs
+		if os.path.relpath(session_dir, root_dir) not in journal_reports
+		or journal_reports[os.path.relpath(session_dir, root_dir)]['signature'] != session_signature(session_dir)]
+	print('Sessions: ', len(session_dirs), ':: done: ', len(session_dirs) - len(pending_dirs), ':: pending: ', len(pending_dirs))
+
+	with open(journal_path, 'a') as journal_file, ProcessPoolExecutor(max_workers=BATCH_WORKERS) as executor:
+		# Строка, запись которой была прервана, завершается, чтобы не испортить следующую запись
+		if journal_file.tell() > 0:
+			with open(journal_path, 'rb') as journal_tail:
+				journal_tail.seek(-1, 2)
+				if b'\n' != journal_tail.read(1):
+					journal_file.write('\n')
+		# Каждый файл проверяется отдельной задачей: нагрузка распределяется по процессам равномернее, чем по сеансам
+		file_futures = {}
+		session_file_reports = {}
+		session_pending_files = {}
+		for session_dir in pending_dirs:
+			session_file_reports[session_dir] = {}
+			session_pending_files[session_dir] = 0
+			for file_name, (index_build, frame_size) in session_files.items():
+				file_path = os.path.join(session_dir, file_name)
+				if True == os.path.exists(file_path):
+					file_futures[executor.submit(file_validate, file_path, index_build, frame_size)] = (session_dir, file_name)
+					session_pending_files[session_dir] += 1
+		for file_future in as_completed(file_futures):
+			session_dir, file_name = file_futures[file_future]
+			session_file_reports[session_dir][file_name] = file_future.result()
+			session_pending_files[session_dir] -= 1
+			if 0 == session_pending_files[session_dir]:
+				session_report = session_report_create(session_dir, root_dir, session_file_reports.pop(session_dir))
+				journal_reports[session_report['session']] = session_report
+				journal_file.write(json.dumps(session_report) + '\n')
+				journal_file.flush()
+				os.fsync(journal_file.fileno())
+				print('Session ', session_report['session'], ':: crc_ok = ', session_report['crc_ok'], ':: time_sequence = ', session_report['time_sequence'])
+
+	session_reports = [journal_reports[os.path.relpath(session_dir, root_dir)] for session_dir in session_dirs]
+	finish_datetime = datetime.now()
+	batch_report = {
+		'root_dir': os.path.abspath(root_dir),
+		'created': finish_datetime.isoformat(),
+		'summary': {
+			'sessions': len(session_reports),
+			'sessions_checked': len(pending_dirs),
+			'sessions_ok': sum(1 for session_report in session_reports
+				if True == session_report['crc_ok'] and True == session_report['time_sequence'] and False == session_report['errors']),
+			'crc_err_frames': sum(len(file_report['crc_err_frames']) for session_report in session_reports for file_report in session_report['files'].values()),
+			'time_err_frames': sum(len(file_report['time_err_frames']) for session_report in session_reports for file_report in session_report['files'].values()),
+			'elapsed_time': str(finish_datetime - start_datetime),
+		},
+		'sessions': session_reports,
+	}
+	report_path = os.path.join(root_dir, BATCH_REPORT_FILE)
+	with open(report_path + '.tmp', 'w') as report_file:
+		json.dump(batch_report, report_file, indent=1)
+	os.replace(report_path + '.tmp', report_path)
+	print('>__ Batch analysis time is ' + str(finish_datetime - start_datetime))
+	return batch_report
+
+if __name__ == '__main__':
+	main(sys.argv[1] if len(sys.argv) > 1 else '.')
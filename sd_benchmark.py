@@ -0,0 +1,180 @@
+'''
+## Замер скорости разбора данных SD карты и данных ModBus на синтетических файлах
+###### Для каждой длительности записи из BENCH_MINUTES создаются файлы CH0..CH2.DAT и DIAG.DAT (с ошибками CRC
+###### и пропусками во времени), затем замеряется время работы adc_parse, diag_parse, sd_data_process и разбора
+###### данных modbus_data. Результат (время, MB/s, фреймов/s, пиковый объем памяти) выводится в формате JSON.
+'''
+import contextlib, glob, io, json, os, sys, tempfile, time, tracemalloc
+import numpy as np
+import adc_parse, diag_parse, modbus_data, modbus_plan, sd_data_gen, sd_index
+
+BENCH_MINUTES = [1, 10, 60] # Длительности записи для замеров, [min]
+BENCH_MEASURE_MEMORY = True # Выполнять отдельный прогон для замера пикового объема памяти (tracemalloc)
+BENCH_OUTPUT_FILE = 'bench_results.json' # Файл результатов (None - только вывод в консоль)
+FRAMES_PER_MINUTE = 30
+
+@contextlib.contextmanager
+def serial_mode():
+	'''
+	Brief Временное отключение обработки в дочерних процессах (каналы АЦП - последовательно, ветви sd_data_process - в потоках), \n
+	чтобы вся память выделялась в текущем процессе и учитывалась tracemalloc \n
+	'''
+	try:
+		import sd_data_process
+	except ImportError:
+		sd_data_process = None
+	parallel_channels = adc_parse.PARALLEL_CHANNELS
+	adc_parse.PARALLEL_CHANNELS = False
+	if sd_data_process is not None:
+		pipeline_processes = sd_data_process.PIPELINE_PROCESSES
+		sd_data_process.PIPELINE_PROCESSES = False
+	try:
+		yield
+	finally:
+		adc_parse.PARALLEL_CHANNELS = parallel_channels
+		if sd_data_process is not None:
+			sd_data_process.PIPELINE_PROCESSES = pipeline_processes
+
+def bench_run(bench_name, bench_func, data_bytes, frame_count):
+	'''
+	Brief Замер времени выполнения и пикового объема памяти функции \n
+	Param[in] *bench_name* название замера \n
+	Param[in] *bench_func* функция без параметров \n
+	Param[in] *data_bytes* объем обрабатываемых данных, байт \n
+	Param[in] *frame_count* количество обрабатываемых фреймов \n
+	Return Словарь с результатами замера \n
+	'''
+	bench_result = {
+		'name': bench_name,
+		'frames': frame_count,
+		'bytes': data_bytes,
+		'elapsed_s': None,
+		'mb_per_s': None,
+		'frames_per_s': None,
+		'peak_mem_mb': None,
+		'error': None,
+	}
+	try:
+		# Вывод модулей разбора в консоль не учитывается
+		with contextlib.redirect_stdout(io.StringIO()):
+			start_time = time.perf_counter()
+			bench_func()
+			elapsed_time = time.perf_counter() - start_time
+			if True == BENCH_MEASURE_MEMORY:
+				with serial_mode():
+					tracemalloc.start()
+					bench_func()
+				bench_result['peak_mem_mb'] = tracemalloc.get_traced_memory()[1] / 2**20
+				tracemalloc.stop()
+	except Exception as bench_error:
+		if tracemalloc.is_tracing():
+			tracemalloc.stop()
+		bench_result['error'] = repr(bench_error)
+		return bench_result
+	bench_result['elapsed_s'] = elapsed_time
+	bench_result['mb_per_s'] = data_bytes / 2**20 / elapsed_time if elapsed_time > 0 else None
+	bench_result['frames_per_s'] = frame_count / elapsed_time if elapsed_time > 0 else None
+	return bench_result
+
+def index_remove():
+	'''
+	Brief Удаление индексных файлов в текущем каталоге, чтобы замер включал проверку фреймов \n
+	'''
+	for index_file in glob.glob('*' + sd_index.INDEX_FILE_SUFFIX):
+		os.remove(index_file)
+
+def bench_sd_files(minutes):
+	'''
+	Brief Замеры разбора файлов SD карты для записи заданной длительности (в текущем каталоге) \n
+	Param[in] *minutes* длительность записи, [min] \n
+	Return Список результатов замеров \n
+	'''
+	frame_count = minutes * FRAMES_PER_MINUTE
+	file_sizes = sd_data_gen.session_generate('.', frame_count,
+		crc_err_frames=[1, frame_count // 2], time_gaps={frame_count // 3: 10})
+	adc_bytes = sum(file_sizes[file_name] for file_name in adc_parse.ADC_FILENAMES)
+	diag_bytes = file_sizes[diag_parse.DIAG_FILENAME]
+
+	def adc_parse_cold():
+		index_remove()
+		adc_parse.main(0, frame_count)
+
+	def sd_data_process_func():
+		# pandas и модуль записи xlsx могут быть не установлены: ошибка импорта попадет в результат замера
+		import sd_data_process
+		data_minute_start, data_minute_number = sd_data_process.DATA_MINUTE_START, sd_data_process.DATA_MINUTE_NUMBER
+		sd_data_process.DATA_MINUTE_START = 0
+		sd_data_process.DATA_MINUTE_NUMBER = minutes
+		try:
+			sd_data_process.func()
+		finally:
+			sd_data_process.DATA_MINUTE_START, sd_data_process.DATA_MINUTE_NUMBER = data_minute_start, data_minute_number
+
+	bench_results = [
+		bench_run('adc_parse', adc_parse_cold, adc_bytes, frame_count * len(adc_parse.ADC_FILENAMES)),
+		bench_run('adc_parse_cached', lambda: adc_parse.main(0, frame_count), adc_bytes, frame_count * len(adc_parse.ADC_FILENAMES)),
+		bench_run('diag_parse', lambda: (index_remove(), diag_parse.main(frame_count)), diag_bytes, frame_count),
+		bench_run('sd_data_process', sd_data_process_func, adc_bytes + diag_bytes, frame_count * 4),
+	]
+	index_remove()
+	return bench_results
+
+def bench_modbus_data(minutes):
+	'''
+	Brief Замеры разбора данных ModBus: по одному набору регистров каждого типа на двухсекундный фрейм \n
+	Param[in] *minutes* длительность записи, [min] \n
+	Return Список результатов замеров \n
+	'''
+	frame_count = minutes * FRAMES_PER_MINUTE
+	rng = np.random.default_rng(0)
+	diag_regs = modbus_plan.RegistersResponse(rng.integers(0, 0xFFFF, 13).tolist())
+	ffts_values = rng.random((3, 4, 48), dtype=np.float32)
+	ffts_regs = {'time': 0}
+	for ch_idx, ch_name in enumerate(modbus_data.ch_list):
+		ffts_regs[ch_name] = [modbus_plan.RegistersResponse(ffts_values[ch_idx][block_idx].view('<u2').tolist()) for block_idx in range(4)]
+	adc_regs = rng.integers(0, 0xFFFF, 123 * 100).tolist()
+
+	def parse_repeat(parse_func, *parse_args):
+		return lambda: [parse_func(*parse_args) for frame_idx in range(frame_count)]
+
+	return [
+		bench_run('modbus_data.parse_diag', parse_repeat(modbus_data.parse_diag, diag_regs), frame_count * 13 * 2, frame_count),
+		bench_run('modbus_data.parse_ffts', parse_repeat(modbus_data.parse_ffts, ffts_regs), frame_count * 3 * 4 * 96 * 2, frame_count),
+		bench_run('modbus_data.parse_adc', parse_repeat(modbus_data.parse_adc, adc_regs, 0), frame_count * len(adc_regs) * 2, frame_count),
+	]
+
+def main():
+	''' #MAIN
+	Brief Выполнение всех замеров, вывод результатов в формате JSON \n
+	Return Список результатов замеров \n
+	'''
+	bench_report = []
+	work_dir = os.getcwd()
+	with tempfile.TemporaryDirectory() as bench_dir:
+		os.chdir(bench_dir)
+		try:
+			for minutes in BENCH_MINUTES:
+				for bench_result in bench_sd_files(minutes) + bench_modbus_data(minutes):
+					bench_result['minutes'] = minutes
+					bench_report.append(bench_result)
+					print(json.dumps(bench_result), file=sys.stderr)
+		finally:
+			os.chdir(work_dir)
+	bench_output = json.dumps({
+		'settings': {
+			'parallel_channels': adc_parse.PARALLEL_CHANNELS,
+			'check_crc': adc_parse.CHECK_CRC,
+			'measure_memory': BENCH_MEASURE_MEMORY,
+			# Прогон замера памяти выполняется без дочерних процессов (см. serial_mode)
+			'memory_mode': {'parallel_channels': False, 'pipeline_processes': False},
+		},
+		'results': bench_report,
+	}, indent=1)
+	if BENCH_OUTPUT_FILE is not None:
+		with open(BENCH_OUTPUT_FILE, 'w') as output_file:
+			output_file.write(bench_output)
+	print(bench_output)
+	return bench_report
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,100 @@
+'''
+## Генерация синтетических файлов данных SD карты (CH0.DAT, CH1.DAT, CH2.DAT, DIAG.DAT) для тестов и замеров скорости
+###### CRC фреймов вычисляется по тем же правилам CRC32-MPEG2 (слова с измененным порядком байт), что и в устройстве.
+###### Можно задать фреймы с ошибкой CRC и пропуски во времени.
+'''
+import os
+from datetime import datetime
+import numpy as np
+import adc_parse, crc32_mpeg2, diag_parse, fattime
+
+GEN_TIME_START = datetime(2023, 3, 3, 10, 0, 0) # Метка времени первого фрейма
+GEN_FRAME_PERIOD = 2 # [s] Интервал между фреймами
+GEN_SIGNAL_FREQ = 50 # [Hz] Частота синусоидального сигнала в данных АЦП
+GEN_SIGNAL_AMPL = 2**22 # Амплитуда сигнала, отсчетов АЦП
+GEN_NOISE_AMPL = 2**12 # Амплитуда шума, отсчетов АЦП
+
+def frame_times_generate(frame_count, time_start=GEN_TIME_START, time_gaps=None):
+	'''
+	Brief Формирование меток времени фреймов \n
+	Param[in] *frame_count* количество фреймов \n
+	Param[in] *time_start* метка времени первого фрейма (datetime) \n
+	Param[in] *time_gaps* словарь {номер фрейма: пропуск перед фреймом, [s]} \n
+	Return Массив меток времени FAT_TIME \n
+	'''
+	frame_offsets = np.full(frame_count, GEN_FRAME_PERIOD, dtype=np.int64)
+	frame_offsets[0] = 0
+	if time_gaps is not None:
+		for frame_idx, gap_seconds in time_gaps.items():
+			frame_offsets[frame_idx] += gap_seconds
+	return fattime.convert_to_fattime_array(np.datetime64(time_start, 's') + np.cumsum(frame_offsets))
+
+def adc_file_generate(file_name, frame_count, time_start=GEN_TIME_START, crc_err_frames=(), time_gaps=None, seed=0):
+	'''
+	Brief Запись файла данных одного канала АЦП: синусоидальный сигнал с шумом \n
+	Param[in] *file_name* имя файла данных \n
+	Param[in] *frame_count* количество фреймов \n
+	Param[in] *time_start* метка времени первого фрейма (datetime) \n
+	Param[in] *crc_err_frames* номера фреймов, в которые записывается неверная CRC \n
+	Param[in] *time_gaps* словарь {номер фрейма: пропуск перед фреймом, [s]} \n
+	Param[in] *seed* начальное значение генератора случайных чисел \n
+	Return Размер записанного файла, байт \n
+	'''
+	rng = np.random.default_rng(seed)
+	adc_frames = np.zeros(frame_count, dtype=adc_parse.adc_frame_dtype)
+	adc_frames['time'] = frame_times_generate(frame_count, time_start, time_gaps)
+	sample_time = np.arange(frame_count * adc_parse.ADC_SAMPLE_NUMBER) * (GEN_FRAME_PERIOD / adc_parse.ADC_SAMPLE_NUMBER)
+	samples = GEN_SIGNAL_AMPL * np.sin(2 * np.pi * GEN_SIGNAL_FREQ * sample_time + seed)
+	samples = samples + rng.integers(-GEN_NOISE_AMPL, GEN_NOISE_AMPL, len(samples))
+	# Отсчет АЦП записывается в три старших байта слова, младший байт не используется
+	adc_frames['data'] = (samples.astype(np.int32) << 8).reshape(frame_count, adc_parse.ADC_SAMPLE_NUMBER)
+	adc_frames['crc'] = crc32_mpeg2.calc_words(adc_frames['data'])
+	adc_frames['crc'][list(crc_err_frames)] ^= 0xFFFFFFFF
+	adc_frames.tofile(file_name)
+	return adc_frames.nbytes
+
+def diag_file_generate(file_name, frame_count, time_start=GEN_TIME_START, crc_err_frames=(), time_gaps=None, seed=0):
+	'''
+	Brief Запись файла данных диагностики \n
+	Param[in] *file_name* имя файла данных \n
+	Param[in] *frame_count* количество фреймов \n
+	Param[in] *time_start* метка времени первого фрейма (datetime) \n
+	Param[in] *crc_err_frames* номера фреймов, в которые записывается неверная CRC \n
+	Param[in] *time_gaps* словарь {номер фрейма: пропуск перед фреймом, [s]} \n
+	Param[in] *seed* начальное значение генератора случайных чисел \n
+	Return Размер записанного файла, байт \n
+	'''
+	rng = np.random.default_rng(seed)
+	diag_frames = np.zeros(frame_count, dtype=diag_parse.diag_frame_dtype)
+	diag_frames['time'] = frame_times_generate(frame_count, time_start, time_gaps)
+	diag_frames['inp_voltage'] = rng.integers(11500, 12500, (frame_count, diag_parse.VOLTAGE_POINTS_COUNT))
+	diag_frames['hum_int'] = rng.integers(300, 400, frame_count)
+	diag_frames['temp_int'] = rng.integers(150, 250, frame_count)
+	diag_frames['hum_ext'] = rng.integers(400, 900, frame_count)
+	diag_frames['temp_ext'] = rng.integers(-200, 300, frame_count)
+	diag_frames['crc'] = diag_parse.diag_frames_crc(diag_frames)
+	diag_frames['crc'][list(crc_err_frames)] ^= 0xFFFFFFFF
+	diag_frames.tofile(file_name)
+	return diag_frames.nbytes
+
+def session_generate(session_dir, frame_count, time_start=GEN_TIME_START, crc_err_frames=(), time_gaps=None):
+	'''
+	Brief Запись полного набора файлов одного сеанса записи (три канала АЦП и диагностика) \n
+	Param[in] *session_dir* каталог сеанса (создается при необходимости) \n
+	Param[in] *frame_count* количество фреймов в каждом файле \n
+	Param[in] *time_start* метка времени первого фрейма (datetime) \n
+	Param[in] *crc_err_frames* номера фреймов с неверной CRC \n
+	Param[in] *time_gaps* словарь {номер фрейма: пропуск перед фреймом, [s]} \n
+	Return Словарь {имя файла: размер, байт} \n
+	'''
+	os.makedirs(session_dir, exist_ok=True)
+	file_sizes = {}
+	for channel_idx, file_name in enumerate(adc_parse.ADC_FILENAMES):
+		file_sizes[file_name] = adc_file_generate(os.path.join(session_dir, file_name), frame_count,
+			time_start, crc_err_frames, time_gaps, seed=channel_idx)
+	file_sizes[diag_parse.DIAG_FILENAME] = diag_file_generate(os.path.join(session_dir, diag_parse.DIAG_FILENAME), frame_count,
+		time_start, crc_err_frames, time_gaps)
+	return file_sizes
+
+if __name__ == '__main__':
+	session_generate('.', adc_parse.ADC_FRAME_NUMBER, crc_err_frames=[5, 100], time_gaps={200: 10})
@@ -1,49 +1,123 @@
 '''
-## Конвертация данных SD карты в Excel. Вызов функций модулей adc_parse и diag_parse, пример работы с данными.
+## Конвертация данных SD карты в Excel (данные АЦП - также в CSV, NPY, Parquet, Feather). Вызов функций модулей adc_parse и diag_parse, пример работы с данными.
 '''
+import queue, threading, time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np
 import pandas as pd
-import adc_parse, diag_parse, json
-from datetime import datetime
+import adc_parse, diag_parse, fattime, sd_export, json
+from datetime import datetime, timedelta
 
 DATA_MINUTE_START = 0 # {0..59} Минута, с которой начинается преобразование данных АЦП
 DATA_MINUTE_NUMBER = 5 # {1..60} Кол-во минут для преобразования данных АЦП
+ADC_EXPORT_FILE = './all_data.xlsx' # Файл данных АЦП, формат по расширению: .csv, .npy, .parquet, .feather, .xlsx (разбивка на листы по 1048576 строк)
+DIAG_VOLTAGE_ROLLUP = {'diag_min': 60, 'diag_hour': 3600} # Листы со статистикой входного напряжения за интервал, [s] ({} - не формировать)
+DATA_TIME_START = None # datetime начала преобразования данных АЦП. Если задано, фреймы ищутся по меткам времени, а не по номеру минуты
+PIPELINE_MODE = True # Обрабатывать данные АЦП и диагностики одновременно, чтение данных АЦП совмещать с записью в файл
+PIPELINE_PROCESSES = True # Выполнять ветви обработки АЦП и диагностики в отдельных процессах (иначе - в потоках)
+PIPELINE_QUEUE_SIZE = 2 # Кол-во порций данных АЦП, прочитанных заранее (ограничивает объем памяти)
 
-'''
-	Обернул данный скрипт в функцию, для того, чтобы можно было легко вызывать из других файлов
-	Также сделал возврат количества затраченного времени
-'''
+PIPELINE_CHUNK = 0 # Типы элементов очереди: порция данных, конец данных, ошибка чтения
+PIPELINE_STOP = 1
+PIPELINE_ERROR = 2
 
+def chunks_prefetch(chunks, stage_times, stage_name, queue_size=PIPELINE_QUEUE_SIZE):
+	'''
+	Brief Чтение порций данных в отдельном потоке с передачей через очередь: чтение и декодирование следующих \n
+	порций выполняется одновременно с записью текущей \n
+	Param[in] *chunks* итератор порций данных \n
+	Param[in] *stage_times* словарь, в который добавляются время чтения [s] (stage_name) и время ожидания очереди [s] (stage_name + '_wait') \n
+	Param[in] *stage_name* название этапа чтения \n
+	Param[in] *queue_size* максимальное кол-во прочитанных, но еще не записанных порций \n
+	Return Генератор порций данных \n
+	'''
+	chunk_queue = queue.Queue(maxsize=queue_size)
+	stop_event = threading.Event()
+	stage_times[stage_name] = 0.0
+	stage_times[stage_name + '_wait'] = 0.0
 
-def func():
-	all_data_int, t = adc_parse.main(DATA_MINUTE_START * 30, DATA_MINUTE_NUMBER * 30) #number of 2-sec buffers, 1800 max.
+	def chunks_read():
+		chunks_iter = iter(chunks)
+		while False == stop_event.is_set():
+			start_time = time.perf_counter()
+			try:
+				chunk = (PIPELINE_CHUNK, next(chunks_iter))
+			except StopIteration:
+				chunk = (PIPELINE_STOP, None)
+			except Exception as read_error:
+				chunk = (PIPELINE_ERROR, read_error)
+			stage_times[stage_name] += time.perf_counter() - start_time
+			# Ожидание места в очереди прерывается, если получатель прекратил чтение
+			while False == stop_event.is_set():
+				try:
+					chunk_queue.put(chunk, timeout=0.1)
+					break
+				except queue.Full:
+					pass
+			if PIPELINE_CHUNK != chunk[0]:
+				return
 
-	df = pd.DataFrame({
-		'ChannelX': all_data_int[0],
-		'ChannelY': all_data_int[1],
-		'ChannelZ': all_data_int[2],
-	})
+	read_thread = threading.Thread(target=chunks_read, daemon=True)
+	read_thread.start()
+	try:
+		while True:
+			start_time = time.perf_counter()
+			chunk_type, chunk = chunk_queue.get()
+			stage_times[stage_name + '_wait'] += time.perf_counter() - start_time
+			if PIPELINE_STOP == chunk_type:
+				return
+			if PIPELINE_ERROR == chunk_type:
+				raise chunk
+			yield chunk
+	finally:
+		stop_event.set()
+		read_thread.join()
 
-	print('Converting to xlsx...')
-	start_datetime = datetime.now()
-	df.to_excel('./all_data.xlsx', sheet_name='adc')
-	finish_datetime = datetime.now()
-	print('>__ Data convert time is ' + str(finish_datetime - start_datetime))
+def adc_export(adc_frame_start, adc_frame_count, export_file, pipeline_mode):
+	'''
+	Brief Чтение, проверка и запись в файл данных АЦП всех каналов \n
+	Param[in] *adc_frame_start* номер первого фрейма \n
+	Param[in] *adc_frame_count* количество фреймов \n
+	Param[in] *export_file* имя файла (формат по расширению, см. sd_export) \n
+	Param[in] *pipeline_mode* совмещать чтение данных с записью в файл \n
+	Return Словарь: время этапов [s] \n
+	'''
+	stage_times = {}
+	print('Converting to ' + export_file + '...')
+	adc_session = adc_parse.AdcParseSession()
+	adc_chunks = sd_export.adc_columns(adc_session.iter_channels(adc_frame_start, adc_frame_count))
+	if True == pipeline_mode:
+		adc_chunks = chunks_prefetch(adc_chunks, stage_times, 'adc_read_decode')
+	export_report = sd_export.export(adc_chunks, export_file)
+	if True == pipeline_mode:
+		stage_times['adc_write'] = export_report['elapsed_time'].total_seconds() - stage_times['adc_read_decode_wait']
+	else:
+		stage_times['adc_read_decode_write'] = export_report['elapsed_time'].total_seconds()
+	for channel_idx in range(len(adc_session.crc_err_frames)):
+		print('Channel = ', channel_idx, ':: crc_ok = ', 0 == len(adc_session.crc_err_frames[channel_idx]),
+			':: time_sequence = ', 0 == len(adc_session.time_err_frames[channel_idx]))
+		print('crc_err idx: ', adc_session.crc_err_frames[channel_idx], ':: time_err idx: ', adc_session.time_err_frames[channel_idx])
+	print('>__ Data convert time is ' + str(export_report['elapsed_time']) + \
+		' (' + str(export_report['rows']) + ' rows, ' + '{0:.1f}'.format(export_report['mb_per_s'] or 0) + ' MB/s)')
+	return stage_times
 
+def diag_export(voltage_rollup):
+	'''
+	Brief Чтение, проверка и запись в файл Excel данных диагностики и статистики входного напряжения \n
+	Param[in] *voltage_rollup* словарь {имя листа: интервал статистики входного напряжения, [s]} \n
+	Return Словарь: время этапов [s] \n
+	'''
 	DIAG_FRAME_COUNT = 1800 # Кол-во фреймов диагностики
 
-	all_data_diag = diag_parse.main(DIAG_FRAME_COUNT) #number of 2-sec buffers, 1800 max.
-	#Выделим напряжения, кратные основной частоте фрейма (каждое 20-е)
-	inp_voltage_cut = []
-	for frame_idx in range(DIAG_FRAME_COUNT):
-		inp_voltage_cut.append(all_data_diag['inp_voltage'][frame_idx * 20])
+	stage_times = {}
+	start_time = time.perf_counter()
+	all_data_diag, t = diag_parse.main(DIAG_FRAME_COUNT) #number of 2-sec buffers, 1800 max.
+	#Статистика по всем 20 точкам входного напряжения каждого фрейма
+	inp_voltage_stats = diag_parse.inp_voltage_stats(all_data_diag['inp_voltage'])
 	#Преобразуем время в понятный текстовый формат
-	time_stamps = []
-	for frame_idx in  range(DIAG_FRAME_COUNT):
-		time_str = \
-			str(all_data_diag['frame_time'][frame_idx]['hour']).zfill(2) + ':' +\
-			str(all_data_diag['frame_time'][frame_idx]['min']).zfill(2) + ':' +\
-			str(all_data_diag['frame_time'][frame_idx]['sec']).zfill(2)
-		time_stamps.append(time_str)
+	frame_time = fattime.convert_to_datetime64_array(all_data_diag['frame_time'])
+	time_stamps = np.char.partition(np.datetime_as_string(frame_time, unit='s'), 'T')[:, 2]
+	stage_times['diag_read_decode'] = time.perf_counter() - start_time
 
 	df = pd.DataFrame({
 		'Time': time_stamps,
@@ -51,14 +125,69 @@ def func():
 		'Temp Int': all_data_diag['temp_int'],
 		'Humi Ext': all_data_diag['hum_ext'],
 		'Temp Ext': all_data_diag['temp_ext'],
-		'Input Vlt': inp_voltage_cut,
+		'Input Vlt Min': inp_voltage_stats['min'],
+		'Input Vlt Max': inp_voltage_stats['max'],
+		'Input Vlt Mean': inp_voltage_stats['mean'],
+		'Input Vlt Std': inp_voltage_stats['std'],
 	})
 
 	print('Converting to xlsx...')
 	start_datetime = datetime.now()
-	df.to_excel('./diag_data.xlsx', sheet_name='diag')
+	with pd.ExcelWriter('./diag_data.xlsx') as excel_writer:
+		df.to_excel(excel_writer, sheet_name='diag')
+		#Статистика входного напряжения за минуту, час
+		for sheet_name, rollup_period in voltage_rollup.items():
+			inp_voltage_rollup = diag_parse.inp_voltage_rollup(all_data_diag['frame_time'], all_data_diag['inp_voltage'], rollup_period)
+			pd.DataFrame({
+				'Time': pd.to_datetime(inp_voltage_rollup['time'], unit='s'),
+				'Frames': inp_voltage_rollup['frames'],
+				'Input Vlt Min': inp_voltage_rollup['min'],
+				'Input Vlt Max': inp_voltage_rollup['max'],
+				'Input Vlt Mean': inp_voltage_rollup['mean'],
+				'Input Vlt Std': inp_voltage_rollup['std'],
+			}).to_excel(excel_writer, sheet_name=sheet_name)
 	finish_datetime = datetime.now()
+	stage_times['diag_write'] = (finish_datetime - start_datetime).total_seconds()
 	print('>__ Data convert time is ' + str(finish_datetime - start_datetime))
-	return finish_datetime - start_datetime
-	# pass
+	return stage_times
+
+'''
+	Обернул данный скрипт в функцию, для того, чтобы можно было легко вызывать из других файлов
+	Также сделал возврат количества затраченного времени
+'''
+
+
+def func():
+	adc_frame_start = DATA_MINUTE_START * 30
+	adc_frame_count = DATA_MINUTE_NUMBER * 30 #number of 2-sec buffers, 1800 max.
+	if DATA_TIME_START is not None:
+		# Номер фрейма по метке времени: при пропусках в записи номер минуты не совпадает с номером фрейма
+		time_range = adc_parse.adc_frames_find(adc_parse.ADC_FILENAMES[0], DATA_TIME_START,
+			DATA_TIME_START + timedelta(minutes = DATA_MINUTE_NUMBER) - timedelta(seconds = 1))
+		adc_frame_start = time_range['frame_start']
+		adc_frame_count = time_range['frame_count']
+		for gap in time_range['gaps']:
+			print('Data gap: ', gap['time_start'], ' - ', gap['time_stop'], ' (', gap['seconds'], ' s)')
+	adc_frame_count = min(adc_frame_count, adc_parse.ADC_FRAME_NUMBER)
+
+	stage_times = {}
+	start_time = time.perf_counter()
+	if True == PIPELINE_MODE:
+		# Обработка данных АЦП и диагностики выполняется одновременно. Запись xlsx (openpyxl) не освобождает GIL,
+		# поэтому по умолчанию ветви обработки выполняются в отдельных процессах
+		executor_class = ProcessPoolExecutor if True == PIPELINE_PROCESSES else ThreadPoolExecutor
+		with executor_class(max_workers=2) as executor:
+			adc_future = executor.submit(adc_export, adc_frame_start, adc_frame_count, ADC_EXPORT_FILE, True)
+			diag_future = executor.submit(diag_export, DIAG_VOLTAGE_ROLLUP)
+			stage_times.update(adc_future.result())
+			stage_times.update(diag_future.result())
+	else:
+		stage_times.update(adc_export(adc_frame_start, adc_frame_count, ADC_EXPORT_FILE, False))
+		stage_times.update(diag_export(DIAG_VOLTAGE_ROLLUP))
+	stage_times['total'] = time.perf_counter() - start_time
+
+	# Этап с наибольшим временем ограничивает общее время обработки
+	for stage_name, stage_time in stage_times.items():
+		print('>__ Stage ' + stage_name + ' time is ' + '{0:.3f}'.format(stage_time) + ' s')
+	return timedelta(seconds = stage_times['diag_write'])
 
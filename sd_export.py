@@ -0,0 +1,248 @@
+'''
+## Потоковая запись разобранных данных SD карты в файлы: CSV, NPY, Parquet, Feather, XLSX
+###### Данные передаются порциями (словарь {имя столбца: массив}), поэтому объем памяти ограничен размером порции.
+###### Формат выбирается по расширению файла. Для XLSX данные разбиваются на листы по EXCEL_MAX_ROWS строк.
+'''
+import os, struct
+from datetime import datetime
+import numpy as np
+
+try:
+	import pyarrow
+	import pyarrow.parquet
+except ImportError:
+	pyarrow = None
+
+EXCEL_MAX_ROWS = 1048576 # Максимальное кол-во строк на листе Excel (включая строку заголовка)
+ADC_COLUMN_NAMES = ['ChannelX', 'ChannelY', 'ChannelZ'] # Имена столбцов данных каналов АЦП
+NPY_HEADER_MAX_ROWS = 10**15 # Кол-во строк, под которое резервируется заголовок файла NPY
+
+class CsvWriter(object):
+	'''
+	Brief Запись порций данных в текстовый файл CSV \n
+	'''
+	def __init__(self, file_name):
+		'''
+		Brief Создание файла \n
+		Param[in] *file_name* имя файла \n
+		'''
+		self._file = open(file_name, 'w', newline='')
+		self._header_written = False
+
+	def write(self, chunk):
+		'''
+		Brief Запись порции данных, перед первой порцией записывается строка заголовка \n
+		Param[in] *chunk* словарь {имя столбца: массив} \n
+		'''
+		if False == self._header_written:
+			self._file.write(','.join(chunk.keys()) + '\n')
+			self._header_written = True
+		columns = list(chunk.values())
+		column_formats = ['%d' if np.issubdtype(column.dtype, np.integer) else '%.7g' for column in columns]
+		np.savetxt(self._file, np.column_stack(columns), fmt=column_formats, delimiter=',')
+
+	def close(self):
+		'''
+		Brief Завершение записи и закрытие файла \n
+		'''
+		self._file.close()
+
+class NpyWriter(object):
+	'''
+	Brief Запись порций данных в файл NPY (структурированный массив, одно поле на столбец). \n
+	Кол-во строк заранее неизвестно: место под заголовок резервируется, заголовок записывается при закрытии \n
+	'''
+	def __init__(self, file_name):
+		'''
+		Brief Создание файла \n
+		Param[in] *file_name* имя файла \n
+		'''
+		self._file = open(file_name, 'wb')
+		self._dtype = None
+		self._row_count = 0
+		self._header_size = 0
+
+	def _header(self, row_count):
+		'''
+		Brief Текст заголовка NPY для заданного кол-ва строк \n
+		'''
+		header = repr({
+			'descr': np.lib.format.dtype_to_descr(self._dtype),
+			'fortran_order': False,
+			'shape': (row_count,),
+		})
+		return header
+
+	def write(self, chunk):
+		'''
+		Brief Запись порции данных \n
+		Param[in] *chunk* словарь {имя столбца: массив} \n
+		'''
+		if self._dtype is None:
+			self._dtype = np.dtype([(column_name, column.dtype) for column_name, column in chunk.items()])
+			# Размер заголовка кратен 64 байтам и не зависит от итогового кол-ва строк
+			self._header_size = (len(np.lib.format.magic(1, 0)) + 2 + len(self._header(NPY_HEADER_MAX_ROWS)) + 1 + 63) // 64 * 64
+			self._file.write(b'\x00' * self._header_size)
+		rows = np.empty(len(next(iter(chunk.values()))), dtype=self._dtype)
+		for column_name, column in chunk.items():
+			rows[column_name] = column
+		rows.tofile(self._file)
+		self._row_count += len(rows)
+
+	def close(self):
+		'''
+		Brief Завершение записи и закрытие файла \n
+		'''
+		if self._dtype is not None:
+			header_length = self._header_size - len(np.lib.format.magic(1, 0)) - 2
+			header = self._header(self._row_count).ljust(header_length - 1) + '\n'
+			self._file.seek(0)
+			self._file.write(np.lib.format.magic(1, 0) + struct.pack('<H', header_length) + header.encode('latin1'))
+		self._file.close()
+
+class ArrowWriter(object):
+	'''
+	Brief Запись порций данных в файл Parquet или Feather (Arrow IPC), требуется модуль pyarrow \n
+	'''
+	def __init__(self, file_name, export_format):
+		'''
+		Brief Подготовка записи \n
+		Param[in] *file_name* имя файла \n
+		Param[in] *export_format* 'parquet' или 'feather' \n
+		'''
+		if pyarrow is None:
+			raise ImportError('pyarrow is required for ' + export_format + ' export')
+		self._file_name = file_name
+		self._export_format = export_format
+		self._writer = None
+
+	def write(self, chunk):
+		'''
+		Brief Запись порции данных, файл создается по схеме первой порции \n
+		Param[in] *chunk* словарь {имя столбца: массив} \n
+		'''
+		table = pyarrow.table(chunk)
+		if self._writer is None:
+			if 'parquet' == self._export_format:
+				self._writer = pyarrow.parquet.ParquetWriter(self._file_name, table.schema)
+			else:
+				self._writer = pyarrow.ipc.new_file(self._file_name, table.schema)
+		self._writer.write_table(table)
+
+	def close(self):
+		'''
+		Brief Завершение записи и закрытие файла \n
+		'''
+		if self._writer is not None:
+			self._writer.close()
+
+class XlsxWriter(object):
+	'''
+	Brief Запись порций данных в файл XLSX в режиме постоянного объема памяти (openpyxl, write_only). \n
+	При превышении EXCEL_MAX_ROWS строк данные продолжаются на следующем листе \n
+	'''
+	def __init__(self, file_name, sheet_name='data'):
+		'''
+		Brief Создание книги Excel \n
+		Param[in] *file_name* имя файла \n
+		Param[in] *sheet_name* имя первого листа (следующие листы нумеруются) \n
+		'''
+		import openpyxl
+		self._file_name = file_name
+		self._workbook = openpyxl.Workbook(write_only=True)
+		self._sheet_name = sheet_name
+		self._sheet = None
+		self._sheet_rows = 0
+		self._column_names = []
+
+	def _sheet_add(self):
+		'''
+		Brief Добавление листа со строкой заголовка \n
+		'''
+		sheet_idx = len(self._workbook.worksheets)
+		self._sheet = self._workbook.create_sheet(self._sheet_name if 0 == sheet_idx else self._sheet_name + str(sheet_idx + 1))
+		self._sheet.append(self._column_names)
+		self._sheet_rows = 1
+
+	def write(self, chunk):
+		'''
+		Brief Запись порции данных с переходом на новый лист при заполнении текущего \n
+		Param[in] *chunk* словарь {имя столбца: массив} \n
+		'''
+		self._column_names = list(chunk.keys())
+		rows = np.column_stack(list(chunk.values())).tolist()
+		row_idx = 0
+		while row_idx < len(rows):
+			if self._sheet is None or EXCEL_MAX_ROWS == self._sheet_rows:
+				self._sheet_add()
+			row_stop = min(len(rows), row_idx + EXCEL_MAX_ROWS - self._sheet_rows)
+			for row in rows[row_idx:row_stop]:
+				self._sheet.append(row)
+			self._sheet_rows += row_stop - row_idx
+			row_idx = row_stop
+
+	def close(self):
+		'''
+		Brief Завершение записи и закрытие файла \n
+		'''
+		self._workbook.save(self._file_name)
+
+def writer_open(file_name, export_format=None):
+	'''
+	Brief Создание объекта записи для формата файла \n
+	Param[in] *file_name* имя файла \n
+	Param[in] *export_format* формат: 'csv', 'npy', 'parquet', 'feather', 'xlsx' (None - по расширению файла) \n
+	Return Объект записи с методами write(chunk) и close() \n
+	'''
+	if export_format is None:
+		export_format = os.path.splitext(file_name)[1].lstrip('.').lower()
+	if 'csv' == export_format:
+		return CsvWriter(file_name)
+	elif 'npy' == export_format:
+		return NpyWriter(file_name)
+	elif export_format in ('parquet', 'feather'):
+		return ArrowWriter(file_name, export_format)
+	elif 'xlsx' == export_format:
+		return XlsxWriter(file_name)
+	raise ValueError('Unsupported export format: ' + export_format)
+
+def export(chunks, file_name, export_format=None):
+	'''
+	Brief Потоковая запись порций данных в файл \n
+	Param[in] *chunks* итератор порций данных: словарей {имя столбца: массив} \n
+	Param[in] *file_name* имя файла \n
+	Param[in] *export_format* формат файла (None - по расширению файла) \n
+	Return Словарь: кол-во строк, объем данных [байт], время записи, строк/s, MB/s \n
+	'''
+	export_report = {
+		'rows': 0,
+		'bytes': 0,
+		'elapsed_time': None,
+		'rows_per_s': None,
+		'mb_per_s': None,
+	}
+	start_datetime = datetime.now()
+	writer = writer_open(file_name, export_format)
+	try:
+		for chunk in chunks:
+			writer.write(chunk)
+			export_report['rows'] += len(next(iter(chunk.values())))
+			export_report['bytes'] += sum(column.nbytes for column in chunk.values())
+	finally:
+		writer.close()
+	export_report['elapsed_time'] = datetime.now() - start_datetime
+	elapsed_seconds = export_report['elapsed_time'].total_seconds()
+	if elapsed_seconds > 0:
+		export_report['rows_per_s'] = export_report['rows'] / elapsed_seconds
+		export_report['mb_per_s'] = export_report['bytes'] / 2**20 / elapsed_seconds
+	return export_report
+
+def adc_columns(channel_chunks_iter, column_names=ADC_COLUMN_NAMES):
+	'''
+	Brief Преобразование порций данных каналов АЦП (см. adc_parse.AdcParseSession.iter_channels) в порции столбцов \n
+	Param[in] *channel_chunks_iter* итератор списков порций, по одной на канал \n
+	Param[in] *column_names* имена столбцов каналов \n
+	Return Генератор словарей {имя столбца: отсчеты АЦП} \n
+	'''
+	for channel_chunks in channel_chunks_iter:
+		yield {column_names[channel_idx]: channel_chunk['samples'] for channel_idx, channel_chunk in enumerate(channel_chunks)}
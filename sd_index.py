@@ -0,0 +1,112 @@
+'''
+## Индекс проверенных фреймов файла данных SD карты (кэш в отдельном файле рядом с файлом данных)
+###### Индекс хранит смещение, метку времени FAT_TIME, вычисленную CRC и результат проверки последовательности
+###### времени для каждого фрейма. Индекс действителен, пока не изменились размер, время изменения и начало файла.
+'''
+import os, json, zipfile, zlib
+import numpy as np
+
+INDEX_FILE_SUFFIX = '.idx.npz'     # Расширение файла индекса
+INDEX_VERSION = 2                  # Версия формата индекса
+INDEX_HEADER_SIZE = 65536          # Кол-во байт начала файла данных, по которым вычисляется контрольная сумма
+INDEX_FIELDS = ['frame_offset', 'frame_time', 'crc_file', 'crc_calc', 'time_ok']
+
+def index_file_name(file_name):
+	'''
+	Brief Имя файла индекса для файла данных \n
+	Param[in] *file_name* имя файла данных \n
+	Return Имя файла индекса \n
+	'''
+	return file_name + INDEX_FILE_SUFFIX
+
+def file_signature(file_name):
+	'''
+	Brief Признаки, по которым определяется изменение файла данных \n
+	Param[in] *file_name* имя файла данных \n
+	Return Словарь: версия индекса, размер, время изменения, CRC начала файла \n
+	'''
+	file_stat = os.stat(file_name)
+	with open(file_name, 'rb') as data_file:
+		header_crc = zlib.crc32(data_file.read(INDEX_HEADER_SIZE))
+	return {
+		'version': INDEX_VERSION,
+		'size': file_stat.st_size,
+		'mtime_ns': file_stat.st_mtime_ns,
+		'header_crc': header_crc,
+	}
+
+def index_create(frame_size, frame_time, crc_file, crc_calc, time_ok):
+	'''
+	Brief Формирование индекса по результатам проверки всех фреймов файла \n
+	Param[in] *frame_size* размер фрейма в файле, байт \n
+	Param[in] *frame_time* метки времени фреймов FAT_TIME \n
+	Param[in] *crc_file* значения CRC, записанные в файл \n
+	Param[in] *crc_calc* вычисленные значения CRC \n
+	Param[in] *time_ok* результат проверки метки времени относительно предыдущего фрейма \n
+	Return Словарь массивов индекса \n
+	'''
+	frame_count = len(frame_time)
+	return {
+		'frame_offset': np.arange(frame_count, dtype=np.int64) * frame_size,
+		'frame_time': np.asarray(frame_time, dtype=np.uint32),
+		'crc_file': np.asarray(crc_file, dtype=np.uint32),
+		'crc_calc': np.asarray(crc_calc, dtype=np.uint32),
+		'time_ok': np.asarray(time_ok, dtype=bool),
+	}
+
+def index_load(file_name):
+	'''
+	Brief Чтение индекса файла данных \n
+	Param[in] *file_name* имя файла данных \n
+	Return Словарь массивов индекса или None (индекса нет, либо файл данных изменился) \n
+	'''
+	try:
+		with np.load(index_file_name(file_name)) as index_data:
+			if json.loads(str(index_data['signature'])) != file_signature(file_name):
+				return None
+			return {field: index_data[field] for field in INDEX_FIELDS}
+	except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile):
+		return None
+
+def index_save(file_name, frame_index):
+	'''
+	Brief Запись индекса файла данных. Ошибка записи (например, защищенная от записи карта) не прерывает работу \n
+	Param[in] *file_name* имя файла данных \n
+	Param[in] *frame_index* словарь массивов индекса \n
+	Return True, если индекс записан \n
+	'''
+	temp_file_name = index_file_name(file_name) + '.tmp'
+	try:
+		with open(temp_file_name, 'wb') as index_file:
+			np.savez(index_file, signature=json.dumps(file_signature(file_name)), **frame_index)
+		os.replace(temp_file_name, index_file_name(file_name))
+	except OSError:
+		return False
+	return True
+
+def index_get(file_name, index_build):
+	'''
+	Brief Получение индекса файла данных: из кэша, либо построение и сохранение нового \n
+	Param[in] *file_name* имя файла данных \n
+	Param[in] *index_build* функция построения индекса по имени файла данных \n
+	Return Словарь массивов индекса \n
+	'''
+	frame_index = index_load(file_name)
+	if frame_index is None:
+		frame_index = index_build(file_name)
+		index_save(file_name, frame_index)
+	return frame_index
+
+def index_errors(frame_index, frame_start, frame_count):
+	'''
+	Brief Ошибки CRC и последовательности времени для диапазона фреймов \n
+	Param[in] *frame_index* словарь массивов индекса \n
+	Param[in] *frame_start* номер первого фрейма диапазона \n
+	Param[in] *frame_count* количество фреймов диапазона \n
+	Return Номера фреймов с ошибкой CRC и с ошибкой времени (относительно начала диапазона) \n
+	'''
+	frame_stop = frame_start + frame_count
+	crc_err_frames = np.flatnonzero(frame_index['crc_calc'][frame_start:frame_stop] != frame_index['crc_file'][frame_start:frame_stop])
+	# Первый фрейм диапазона не сравнивается с предыдущим
+	time_err_frames = np.flatnonzero(~frame_index['time_ok'][frame_start + 1:frame_stop]) + 1
+	return crc_err_frames.tolist(), time_err_frames.tolist()
@@ -0,0 +1,186 @@
+'''
+## Чтение файлов данных SD карты с произвольным доступом к фреймам через отображение файла в память (mmap)
+###### и чтение новых фреймов файла, в который еще идет запись
+'''
+import bisect, mmap, os, time
+from datetime import datetime
+import numpy as np
+import fattime, time_sequence
+
+FRAME_PERIOD = 2 # [s] Интервал между метками времени соседних фреймов
+FOLLOW_POLL_INTERVAL = 1.0 # [s] Интервал опроса размера файла, в который идет запись
+
+class FrameReader(object):
+	'''
+	Brief Файл данных SD карты, представленный как массив фреймов фиксированного размера. \n
+	Фреймы возвращаются как представления (view) отображенного в память файла, без копирования, \n
+	поэтому с диска читаются только страницы, к которым действительно было обращение \n
+	'''
+	def __init__(self, file_name, frame_dtype):
+		'''
+		Brief Открытие файла данных и отображение его в память \n
+		Param[in] *file_name* имя файла данных \n
+		Param[in] *frame_dtype* структура фрейма (numpy.dtype) \n
+		'''
+		self.file_name = file_name
+		self.frame_dtype = np.dtype(frame_dtype)
+		self._file = open(file_name, 'rb')
+		self._mmap = None
+		self._frames = np.empty(0, dtype=self.frame_dtype)
+		file_size = self._file.seek(0, 2)
+		# Пустой файл отобразить в память нельзя
+		if file_size > 0:
+			self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+			self._frames = np.frombuffer(self._mmap, dtype=self.frame_dtype, count=file_size // self.frame_dtype.itemsize)
+
+	def __len__(self):
+		'''
+		Brief Количество полных фреймов в файле \n
+		'''
+		return len(self._frames)
+
+	def __getitem__(self, frame_idx):
+		'''
+		Brief Доступ к фрейму или диапазону фреймов по номеру \n
+		Param[in] *frame_idx* номер фрейма или срез \n
+		Return Фрейм или массив фреймов (представление без копирования данных) \n
+		'''
+		return self._frames[frame_idx]
+
+	def frames(self, frame_start=0, frame_count=None):
+		'''
+		Brief Диапазон фреймов, ограниченный размером файла \n
+		Param[in] *frame_start* номер фрейма, с которого начинается чтение \n
+		Param[in] *frame_count* количество фреймов (None - до конца файла) \n
+		Return Массив фреймов (представление без копирования данных) \n
+		'''
+		if frame_count is None:
+			return self._frames[frame_start:]
+		return self._frames[frame_start:frame_start + frame_count]
+
+	def frame_time(self, frame_idx):
+		'''
+		Brief Метка времени фрейма, читается только заголовок фрейма \n
+		Param[in] *frame_idx* номер фрейма \n
+		Return Временная метка в формате FAT_TIME \n
+		'''
+		return int(self._frames['time'][frame_idx])
+
+	def find_time_range(self, time_start, time_stop):
+		'''
+		Brief Поиск фреймов в интервале времени двоичным поиском по заголовкам фреймов (O(log n) чтений). \n
+		Метки времени в файле должны возрастать: значение FAT_TIME монотонно растет вместе со временем \n
+		Param[in] *time_start* начало интервала: FAT_TIME или datetime \n
+		Param[in] *time_stop* конец интервала (включительно): FAT_TIME или datetime \n
+		Return Словарь: номер первого фрейма, кол-во фреймов и список пропусков данных внутри интервала \n
+		'''
+		if isinstance(time_start, datetime):
+			time_start = fattime.convert_from_datetime(time_start)
+		if isinstance(time_stop, datetime):
+			time_stop = fattime.convert_from_datetime(time_stop)
+		# Обращение к элементу поля 'time' читает из файла только заголовок одного фрейма
+		frame_times = self._frames['time']
+		frame_start = bisect.bisect_left(frame_times, time_start)
+		frame_stop = bisect.bisect_right(frame_times, time_stop, lo=frame_start)
+		time_range = {
+			'frame_start': frame_start,
+			'frame_count': frame_stop - frame_start,
+			'gaps': [],
+		}
+		# Пропуски: начало и конец интервала без данных, разрывы последовательности меток внутри интервала
+		edge_seconds = fattime.convert_to_seconds_array(np.array([time_start, time_stop], dtype=np.uint32))
+		for gap in time_sequence.find_time_gaps(edge_seconds[0], fattime.convert_to_seconds_array(frame_times[frame_start:frame_stop]),
+			edge_seconds[1], FRAME_PERIOD):
+			gap['frame_idx'] += frame_start
+			time_range['gaps'].append(gap)
+		return time_range
+
+	def close(self):
+		'''
+		Brief Закрытие файла. Отображение освобождается, когда удалены все полученные из него фреймы \n
+		'''
+		self._frames = np.empty(0, dtype=self.frame_dtype)
+		if self._mmap is not None:
+			try:
+				self._mmap.close()
+			except BufferError:
+				# Есть живые представления фреймов: память будет освобождена вместе с ними
+				pass
+			self._mmap = None
+		self._file.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
+
+class FrameFollower(object):
+	'''
+	Brief Чтение файла данных SD карты, в который еще идет запись: при каждом опросе читаются только фреймы, \n
+	записанные полностью после предыдущего опроса. Рост файла определяется опросом размера (os.stat) \n
+	'''
+	def __init__(self, file_name, frame_dtype, frame_start=0):
+		'''
+		Brief Подготовка чтения \n
+		Param[in] *file_name* имя файла данных (файла может еще не быть) \n
+		Param[in] *frame_dtype* структура фрейма (numpy.dtype) \n
+		Param[in] *frame_start* номер фрейма, с которого начинается чтение (продолжение после перезапуска) \n
+		'''
+		self.file_name = file_name
+		self.frame_dtype = np.dtype(frame_dtype)
+		self.frame_count = frame_start
+
+	@property
+	def frame_offset(self):
+		'''
+		Brief Смещение в файле после последнего прочитанного фрейма, байт \n
+		'''
+		return self.frame_count * self.frame_dtype.itemsize
+
+	def poll(self):
+		'''
+		Brief Чтение фреймов, записанных полностью с момента предыдущего опроса. Неполный фрейм в конце файла \n
+		будет прочитан при следующем опросе. Если файл стал меньше (начата новая запись), чтение начинается сначала \n
+		Return Номер первого прочитанного фрейма и массив прочитанных фреймов (пустой, если новых фреймов нет) \n
+		'''
+		try:
+			file_size = os.stat(self.file_name).st_size
+		except FileNotFoundError:
+			file_size = 0
+		if file_size < self.frame_offset:
+			self.frame_count = 0
+		frame_start = self.frame_count
+		new_frame_count = file_size // self.frame_dtype.itemsize - frame_start
+		if new_frame_count <= 0:
+			return frame_start, np.empty(0, dtype=self.frame_dtype)
+		with open(self.file_name, 'rb') as data_file:
+			data_file.seek(self.frame_offset)
+			frames_buffer = data_file.read(new_frame_count * self.frame_dtype.itemsize)
+		frames = np.frombuffer(frames_buffer, dtype=self.frame_dtype, count=len(frames_buffer) // self.frame_dtype.itemsize)
+		self.frame_count += len(frames)
+		return frame_start, frames
+
+	def follow(self, frames_process, poll_interval=FOLLOW_POLL_INTERVAL, idle_timeout=None, stop_event=None):
+		'''
+		Brief Опрос файла до остановки: новые фреймы передаются в функцию обработки \n
+		Param[in] *frames_process* функция обработки (номер первого фрейма, массив фреймов) \n
+		Param[in] *poll_interval* интервал опроса размера файла, [s] \n
+		Param[in] *idle_timeout* остановка, если файл не растет заданное время, [s] (None - без ограничения) \n
+		Param[in] *stop_event* объект threading.Event для остановки из другого потока (None - не используется) \n
+		Return Количество прочитанных фреймов \n
+		'''
+		idle_start = time.monotonic()
+		while stop_event is None or False == stop_event.is_set():
+			frame_start, frames = self.poll()
+			if len(frames) > 0:
+				frames_process(frame_start, frames)
+				idle_start = time.monotonic()
+			elif idle_timeout is not None and time.monotonic() - idle_start >= idle_timeout:
+				break
+			else:
+				if stop_event is None:
+					time.sleep(poll_interval)
+				else:
+					stop_event.wait(poll_interval)
+		return self.frame_count
@@ -7,8 +7,7 @@
 ###### **read_adc_saved** возвращает исходные данные АЦП, прочитанные из карты памяти
 ###### **set_time** устанавливает время компьютера на устройстве
 '''
-from pymodbus.client import ModbusSerialClient
-import sched, time, fattime, skif_chart, modbus_data
+import sched, time, fattime, skif_chart, modbus_bulk, modbus_data, modbus_plan, modbus_transport, modbus_wait
 from multiprocessing import Process, Pipe
 
 mode = {
@@ -29,6 +28,10 @@ req_data_fat_time = fattime.convert_to_fattime({
 	'year': 2023,
 })
 
+# Соединение с устройством (см. modbus_transport): последовательный порт или TCP (GSM модем, шлюз)
+MODBUS_TRANSPORT = {'transport': 'serial', 'port': 'COM5', 'baudrate': 115200, 'timeout': 10}
+#MODBUS_TRANSPORT = {'transport': 'rtu_over_tcp', 'host': '192.168.0.10', 'port': 502, 'timeout': 10, 'keepalive_slave': 42}
+
 MODBUS_BROADCAST_ID = 0            # Широковещательный адрес ModBus
 MODBUS_SLAVE_ID = 42               # Индивидуальный адрес slave-устройства ModBus (платы с измерителем)
 MODBUS_DIAG_ADDR =  0              # Стартовый адрес регистров диагностики
@@ -50,113 +53,159 @@ MODBUS_STATUS_SD_ADC = 0x1000           # Бит статуса: чтение AD
 MODBUS_STATUS_SD_FFTS_SUCC = 0x2000     # Бит статуса: статус операции чтения FFTS из SD карты
 MODBUS_STATUS_SD_ADC_SUCC = 0x4000      # Бит статуса: статус операции чтения ADC из SD карты
 
-g_old_time = 0
+PRINT_READ_REPORT = False # Выводить в консоль отчеты чтения (кол-во запросов, повторов, скорость обмена)
+
+def device_state_create():
+	'''
+	Brief Создание состояния обмена с одним устройством \n
+	Return Словарь: метка времени последних выведенных данных диагностики, последний отчет чтения FFTS, \n
+	объекты ожидания чтения FFTS и ADC из SD карты в RAM буфер (начальная задержка первого опроса, далее - \n
+	по статистике времени выполнения команд этого устройства) \n
+	'''
+	return {
+		'old_time': 0,
+		'ffts_read_report': None,
+		'sd_ffts_waiter': modbus_wait.ReadyWaiter(first_poll=0.01),
+		'sd_adc_waiter': modbus_wait.ReadyWaiter(first_poll=0.03),
+	}
+
+# Состояние обмена с устройством MODBUS_SLAVE_ID (для опроса нескольких устройств см. skif_poller)
+g_device_state = device_state_create()
 
 ch_list = ['ch1', 'ch2', 'ch3']
 
 mb_request_sched = sched.scheduler(time.time, time.sleep)   # установка расписания для вызова функции
-rtu_client = ModbusSerialClient(method='rtu', port='COM5', baudrate=115200, timeout=10, parity='N', stopbits=1)
-rtu_client.connect()
+rtu_client = None # Соединение ModBus, создается при запуске (main), чтобы модуль можно было импортировать без подключения к порту
 
-def read_diag(rtu_client_local):
+def read_diag(rtu_client_local, slave_id=MODBUS_SLAVE_ID, device_state=g_device_state):
 	'''
 	Brief  Чтение данных диагностики \n
 	Param[in] *rtu_client_local* класс с методами и данными ModBus для обращения к устройству \n
-	Return Данные диагностики \n
+	Param[in] *slave_id* адрес slave-устройства ModBus \n
+	Param[in] *device_state* состояние обмена с устройством (см. device_state_create) \n
+	Return Данные диагностики или 0 (в случае ошибки) \n
 	'''
-	request_diag = rtu_client_local.read_holding_registers(MODBUS_DIAG_ADDR, MODBUS_DIAG_SIZE, MODBUS_SLAVE_ID)
+	request_diag = rtu_client_local.read_holding_registers(MODBUS_DIAG_ADDR, MODBUS_DIAG_SIZE, slave_id)
+	if request_diag.isError():
+		return 0
 	diag_data = modbus_data.parse_diag(request_diag)
 	# Выведем в консоль результаты диагностики, игнорируя повторные значения (на основе сравнения меток времени)
-	global g_old_time
-	if g_old_time < diag_data['regs']['time']:
+	if device_state['old_time'] < diag_data['regs']['time']:
 		print('Status BITS: ', diag_data['status'])
 		print('Diagnostic REGS: ', diag_data['regs'])
-	g_old_time = diag_data['regs']['time']
+	device_state['old_time'] = diag_data['regs']['time']
 	return diag_data
 
-def read_ffts(rtu_client_local, start_addr):
+def read_status(rtu_client_local, slave_id=MODBUS_SLAVE_ID):
+	'''
+	Brief  Чтение слова статуса устройства \n
+	Param[in] *rtu_client_local* класс с методами и данными ModBus для обращения к устройству \n
+	Param[in] *slave_id* адрес slave-устройства ModBus \n
+	Return Слово статуса (биты MODBUS_STATUS_*) или None (в случае ошибки: 0 - допустимое значение статуса) \n
+	'''
+	request_status = rtu_client_local.read_holding_registers(MODBUS_DIAG_ADDR, 1, slave_id)
+	if request_status.isError():
+		return None
+	return request_status.registers[int(0)]
+
+def read_ffts(rtu_client_local, start_addr, slave_id=MODBUS_SLAVE_ID, device_state=g_device_state):
 	'''
 	Brief Чтение данных частотного анализа по протоколу ModBus RTU \n
 	Param[in] *rtu_client_local* класс с методами и данными ModBus для обращения к устройству \n
 	Param[in] *start_addr* стартовый адрес данных ModBus \n
+	Param[in] *slave_id* адрес slave-устройства ModBus \n
+	Param[in] *device_state* состояние обмена с устройством (см. device_state_create) \n
 	Return Набор регистров с данными частотного анализа \n
 	'''
 	FREQ_BLOCK_REG_COUNT = 96  # Кол-во анализируемых гармоник
 	TIME_REG_COUNT = 2         # Кол-во регистров времени
 	CH_REG_COUNT = FREQ_BLOCK_REG_COUNT * 4 + TIME_REG_COUNT  # Полное кол-во регистров частотного анализа для одного канала
-	# Чтение набора регистров FFTS
-	ffts_regs = {}
+	# Диапазоны регистров FFTS всех каналов и блоков (и метки времени для буфера RAM) читаются объединенными запросами
+	reg_ranges = []
 	for ch_idx in range(3):
-		ch_name = ch_list[ch_idx]
-		request_ffts = []
 		for block_idx in range(4):
-			request_ffts.append(rtu_client_local.read_holding_registers(start_addr + block_idx * FREQ_BLOCK_REG_COUNT + ch_idx * CH_REG_COUNT,\
-				FREQ_BLOCK_REG_COUNT, MODBUS_SLAVE_ID))
-		ffts_regs[ch_name] = request_ffts
+			reg_ranges.append((start_addr + block_idx * FREQ_BLOCK_REG_COUNT + ch_idx * CH_REG_COUNT, FREQ_BLOCK_REG_COUNT))
+	if MODBUS_FFTS_RAM_ADDR == start_addr:
+		reg_ranges.append((MODBUS_FFTS_RAM_ADDR + 4 * FREQ_BLOCK_REG_COUNT, TIME_REG_COUNT))
+	responses, ffts_read_report = modbus_plan.read_ranges(
+		lambda reg_addr, reg_count: rtu_client_local.read_holding_registers(reg_addr, reg_count, slave_id), reg_ranges)
+	ffts_regs = {}
+	for ch_idx in range(3):
+		ffts_regs[ch_list[ch_idx]] = responses[ch_idx * 4:ch_idx * 4 + 4]
+	# Объем обмена для одного фрейма FFTS: кол-во запросов и байт (при PRINT_READ_REPORT выводится в консоль при изменении)
+	ffts_regs['read_report'] = ffts_read_report
+	if True == PRINT_READ_REPORT and device_state['ffts_read_report'] != ffts_read_report:
+		print('FFTS read: ', ffts_read_report)
+	device_state['ffts_read_report'] = ffts_read_report
 	# Прочитаем текущую метку времени и обновим указатель чтения
 	if MODBUS_FFTS_RAM_ADDR == start_addr:
-		request_time = rtu_client_local.read_holding_registers(256 + (block_idx + 1) * FREQ_BLOCK_REG_COUNT, TIME_REG_COUNT, MODBUS_SLAVE_ID)
+		request_time = responses[-1]
 		ffts_regs['time'] = request_time.registers[int(0)] + (request_time.registers[int(1)] << 16)
-		request_read_fifo_ptr = rtu_client_local.write_registers(MODBUS_CONTROL_ADDR, [MODBUS_COMMAND_READ_FIFO], MODBUS_SLAVE_ID)
+		request_read_fifo_ptr = rtu_client_local.write_registers(MODBUS_CONTROL_ADDR, [MODBUS_COMMAND_READ_FIFO], slave_id)
 	else:
 		ffts_regs['time'] = 0
 	return ffts_regs
 
-def read_ffts_stream(rtu_client_local):
+def read_ffts_stream(rtu_client_local, slave_id=MODBUS_SLAVE_ID, device_state=g_device_state):
 	'''
 	Brief Чтение текущих данных частотного анализа устройства \n
 	Param[in] *rtu_client_local* класс с методами и данными ModBus для обращения к устройству \n
+	Param[in] *slave_id* адрес slave-устройства ModBus \n
+	Param[in] *device_state* состояние обмена с устройством (см. device_state_create) \n
 	Return Объект с данные частотного анализа \n
 	'''
-	ffts_regs = read_ffts(rtu_client_local, MODBUS_FFTS_RAM_ADDR)
+	ffts_regs = read_ffts(rtu_client_local, MODBUS_FFTS_RAM_ADDR, slave_id, device_state)
 	return modbus_data.parse_ffts(ffts_regs)
 
-def read_ffts_saved(rtu_client_local, time_stamp):
+def read_ffts_saved(rtu_client_local, time_stamp, slave_id=MODBUS_SLAVE_ID, device_state=g_device_state):
 	'''
 	Brief  Чтение данных частотного анализа, сохранненых на карте памяти SD \n
 	Param[in] *rtu_client_local* класс с методами и данными ModBus для обращения к устройству \n
 	Param[in] *time_stamp* временная метка запрашиваемых данных \n
+	Param[in] *slave_id* адрес slave-устройства ModBus \n
+	Param[in] *device_state* состояние обмена с устройством (см. device_state_create) \n
 	Return Объект с данными частотного анализа или 0 (в случае ошибки) \n
 	'''
 	read_ffts_regs = []
 	read_ffts_regs.append(MODBUS_COMMAND_READ_FFTS)
 	read_ffts_regs.append(time_stamp & 0x0000FFFF)
 	read_ffts_regs.append((time_stamp & 0xFFFF0000) >> 16)
-	rtu_client_local.write_registers(MODBUS_CONTROL_ADDR, read_ffts_regs, MODBUS_SLAVE_ID)
-	# Проверка завершения чтения FFTS из SD карты в RAM буфер. Если данные готовы, то прочитаем их
-	time.sleep(0.01)
-	request_status = rtu_client_local.read_holding_registers(MODBUS_DIAG_ADDR, 1, MODBUS_SLAVE_ID)
-	if 0 == (request_status.registers[int(0)] & MODBUS_STATUS_SD_FFTS) and 0 == (request_status.registers[int(0)] & MODBUS_STATUS_SD_FFTS_SUCC):
-		ffts_regs = read_ffts(rtu_client_local, MODBUS_FFTS_SD_ADDR)
+	rtu_client_local.write_registers(MODBUS_CONTROL_ADDR, read_ffts_regs, slave_id)
+	# Ожидание завершения чтения FFTS из SD карты в RAM буфер. Если данные готовы, то прочитаем их
+	status, wait_time = device_state['sd_ffts_waiter'].wait(lambda: read_status(rtu_client_local, slave_id), MODBUS_STATUS_SD_FFTS)
+	if status is not None and 0 == (status & MODBUS_STATUS_SD_FFTS_SUCC):
+		ffts_regs = read_ffts(rtu_client_local, MODBUS_FFTS_SD_ADDR, slave_id, device_state)
 		return modbus_data.parse_ffts(ffts_regs)
 	else:
 		return 0
 
-def read_adc_saved(rtu_client_local, time_stamp):
+def read_adc_saved(rtu_client_local, time_stamp, slave_id=MODBUS_SLAVE_ID, device_state=g_device_state):
 	'''
 	Brief  Чтение бинарных данных АЦП, сохраненных на карте памяти SD. Прочитаем 8200 * 3 = 24600 байт (12300 регистров) \n
 	Param[in] *rtu_client_local* класс с методами и данными ModBus для обращения к устройству \n
 	Param[in] *time_stamp* временная метка запрашиваемых данных \n
+	Param[in] *slave_id* адрес slave-устройства ModBus \n
+	Param[in] *device_state* состояние обмена с устройством (см. device_state_create) \n
 	Return Объект с данными АЦП или 0 (в случае ошибки) \n
 	'''
 	read_adc_regs = []
 	read_adc_regs.append(MODBUS_COMMAND_READ_ADC)
 	read_adc_regs.append(time_stamp & 0x0000FFFF)
 	read_adc_regs.append((time_stamp & 0xFFFF0000) >> 16)
-	rtu_client_local.write_registers(MODBUS_CONTROL_ADDR, read_adc_regs, MODBUS_SLAVE_ID)
-	# Проверка завершения чтения данных ADC из SD карты в RAM буфер. Если данные готовы, то прочитаем их
-	time.sleep(0.03)
-	request_status = rtu_client_local.read_holding_registers(MODBUS_DIAG_ADDR, 1, MODBUS_SLAVE_ID)
-	if 0 == (request_status.registers[int(0)] & MODBUS_STATUS_SD_ADC) and 0 == (request_status.registers[int(0)] & MODBUS_STATUS_SD_ADC_SUCC):
+	rtu_client_local.write_registers(MODBUS_CONTROL_ADDR, read_adc_regs, slave_id)
+	# Ожидание завершения чтения данных ADC из SD карты в RAM буфер. Если данные готовы, то прочитаем их
+	status, wait_time = device_state['sd_adc_waiter'].wait(lambda: read_status(rtu_client_local, slave_id), MODBUS_STATUS_SD_ADC)
+	if status is not None and 0 == (status & MODBUS_STATUS_SD_ADC_SUCC):
 		# Прочитаем данные АЦП, переписанные с карты памяти в RAM-буфер (100 блоков по 123 16-битных регистра)
 		BLOCK_SIZE = 123
 		BLOCK_COUNT = 100
-		adc_data_regs = []
-		for block_idx in range(BLOCK_COUNT):
-			block_data = rtu_client_local.read_holding_registers(MODBUS_ADC_SD_ADDR + block_idx * BLOCK_SIZE,\
-					BLOCK_SIZE, MODBUS_SLAVE_ID)
-			for reg_idx in range(BLOCK_SIZE):
-				adc_data_regs.append(block_data.registers[reg_idx])
+		adc_data_regs, read_report = modbus_bulk.read_bulk(
+			lambda reg_addr, reg_count: rtu_client_local.read_holding_registers(reg_addr, reg_count, slave_id),
+			MODBUS_ADC_SD_ADDR, BLOCK_SIZE * BLOCK_COUNT, BLOCK_SIZE)
+		if True == PRINT_READ_REPORT:
+			print('ADC read: ', read_report, ':: SD wait: ', device_state['sd_adc_waiter'].report())
+		if len(read_report['failed_blocks']) > 0:
+			return 0
 		return modbus_data.parse_adc(adc_data_regs, time_stamp)
 	else:
 		return 0
@@ -195,6 +244,9 @@ def mb_request_func(parent_conn):
 		while fifo_level > 2:
 			# Прочитаем данные диагностики
 			diag_data = read_diag(rtu_client)
+			if 0 == diag_data:
+				print('Diagnostic data request error')
+				break
 			fifo_level = diag_data['regs']['fifo_level']
 			# Прочитаем данные частотного анализа и отправим в графический модуль
 			if diag_data['regs']['fifo_wr'] != (diag_data['regs']['fifo_rd'] + 1):
@@ -233,6 +285,9 @@ def main():
 		plot.start()
 	#plt.show(block=False)
 
+	global rtu_client
+	rtu_client = modbus_transport.connection_get(MODBUS_TRANSPORT)
+
 	# Установим время на удаленном устройстве (широковещательная команда на адрес 0)
 	if 1 == mode['set_time']:
 		set_time(rtu_client)
@@ -0,0 +1,199 @@
+'''
+## Опрос нескольких устройств (плат с измерителями) на нескольких шинах ModBus
+###### Для каждой шины (последовательный порт RS-485 или шлюз ModBus TCP) работает отдельная сопрограмма:
+###### транзакции устройств одной шины выполняются строго по очереди, разные шины опрашиваются параллельно.
+###### Для каждого устройства задаются свои периоды опроса диагностики, текущих данных FFTS и данных с SD карты.
+'''
+import asyncio, time
+from concurrent.futures import ThreadPoolExecutor
+import modbus_transport, skif_master
+
+POLLER_RUN_TIME = None # [s] Время опроса (None - до остановки)
+POLLER_REPORT_PERIOD = 10.0 # [s] Период вывода статистики опроса в консоль (None - не выводить)
+
+# Шины: настройки соединения (см. modbus_transport) - последовательный порт, шлюз ModBus TCP или GSM модем (RTU поверх TCP)
+POLLER_BUSES = {
+	'rs485_1': {'transport': 'serial', 'port': 'COM5', 'baudrate': 115200, 'timeout': 10},
+	#'gateway_1': {'transport': 'tcp', 'host': '192.168.0.10', 'port': 502, 'timeout': 10},
+	#'gsm_1': {'transport': 'rtu_over_tcp', 'host': '10.0.0.2', 'port': 4001, 'timeout': 10, 'keepalive_slave': 42},
+}
+# Устройства: шина, адрес ModBus и периоды опроса [s] (None - не опрашивать)
+POLLER_DEVICES = [
+	{
+		'name': 'skif_42',
+		'bus': 'rs485_1',
+		'slave_id': skif_master.MODBUS_SLAVE_ID,
+		'diag_period': 1.0,               # Данные диагностики
+		'ffts_stream_period': None,       # Текущие данные частотного анализа (буфер FIFO)
+		'sd_period': 1.0,                 # Данные с SD карты
+		'sd_data': 'ffts_saved',          # Данные с SD карты: 'ffts_saved' или 'adc_saved'
+		'sd_time': skif_master.req_data_fat_time, # Временная метка запрашиваемых данных SD карты (fattime)
+	},
+]
+
+# Функции чтения данных: имя задачи опроса, функция (клиент, устройство, состояние обмена с устройством) -> данные или 0 (ошибка)
+poll_funcs = {
+	'diag': lambda client, device, device_state: skif_master.read_diag(client, device['slave_id'], device_state),
+	'ffts_stream': lambda client, device, device_state: skif_master.read_ffts_stream(client, device['slave_id'], device_state),
+	'ffts_saved': lambda client, device, device_state: skif_master.read_ffts_saved(client, device['sd_time'], device['slave_id'], device_state),
+	'adc_saved': lambda client, device, device_state: skif_master.read_adc_saved(client, device['sd_time'], device['slave_id'], device_state),
+}
+
+def bus_client_create(bus_config):
+	'''
+	Brief Постоянное соединение шины из пула соединений \n
+	Param[in] *bus_config* настройки шины (см. POLLER_BUSES) \n
+	Return Объект modbus_transport.ModbusConnection \n
+	'''
+	return modbus_transport.connection_get(bus_config)
+
+def device_tasks(device):
+	'''
+	Brief Задачи опроса устройства с заданными периодами \n
+	Param[in] *device* настройки устройства (см. POLLER_DEVICES) \n
+	Return Список задач: [имя задачи, период [s]] \n
+	'''
+	tasks = []
+	if device.get('diag_period') is not None:
+		tasks.append(['diag', device['diag_period']])
+	if device.get('ffts_stream_period') is not None:
+		tasks.append(['ffts_stream', device['ffts_stream_period']])
+	if device.get('sd_period') is not None:
+		tasks.append([device.get('sd_data', 'ffts_saved'), device['sd_period']])
+	return tasks
+
+class BusPoller(object):
+	'''
+	Brief Опрос устройств одной шины: транзакции выполняются по очереди в отдельном потоке шины \n
+	'''
+	def __init__(self, bus_name, client, devices, data_process):
+		'''
+		Brief Создание объекта опроса шины \n
+		Param[in] *bus_name* имя шины \n
+		Param[in] *client* соединение ModBus (modbus_transport.ModbusConnection или синхронный клиент pymodbus) \n
+		Param[in] *devices* список настроек устройств этой шины \n
+		Param[in] *data_process* функция обработки данных (имя устройства, имя задачи, данные) \n
+		'''
+		self.bus_name = bus_name
+		self.client = client
+		self.devices = devices
+		self.data_process = data_process
+		# Состояние обмена (в т.ч. статистика времени чтения SD карты) - отдельно для каждого устройства шины
+		self.device_states = {device['slave_id']: skif_master.device_state_create() for device in devices}
+		# Один поток на шину: обращения к порту выполняются из одного потока, не блокируя цикл событий
+		self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='modbus_' + bus_name)
+		# Блокировка шины для транзакций вне расписания (например, установка времени)
+		self.lock = asyncio.Lock()
+		self.stats = {}
+
+	async def transaction(self, func, *args):
+		'''
+		Brief Выполнение транзакции на шине: ожидание освобождения шины и вызов функции в потоке шины \n
+		Param[in] *func* функция (клиент, *args) \n
+		Return Результат функции \n
+		'''
+		async with self.lock:
+			return await asyncio.get_running_loop().run_in_executor(self.executor, func, self.client, *args)
+
+	def _stats_update(self, device, task_name, late_time, busy_time, data_ok):
+		'''
+		Brief Учет выполнения задачи опроса: кол-во, ошибки, время занятости шины и опоздание относительно расписания \n
+		'''
+		task_stats = self.stats.setdefault((device['name'], task_name),
+			{'count': 0, 'errors': 0, 'busy_s': 0.0, 'busy_max_s': 0.0, 'late_max_s': 0.0})
+		task_stats['count'] += 1
+		task_stats['errors'] += 0 if True == data_ok else 1
+		task_stats['busy_s'] += busy_time
+		task_stats['busy_max_s'] = max(task_stats['busy_max_s'], busy_time)
+		task_stats['late_max_s'] = max(task_stats['late_max_s'], late_time)
+
+	async def run(self, stop_event):
+		'''
+		Brief Опрос устройств шины по расписанию до установки stop_event. Задача, которая не успела выполниться \n
+		в свой период (шина занята), выполняется один раз и планируется от текущего времени, без накопления пропусков \n
+		Param[in] *stop_event* asyncio.Event остановки опроса \n
+		'''
+		start_time = time.monotonic()
+		schedule = [[start_time, device, task_name, period] for device in self.devices for task_name, period in device_tasks(device)]
+		while False == stop_event.is_set() and len(schedule) > 0:
+			task = min(schedule, key=lambda task: task[0])
+			due_time, device, task_name, period = task
+			try:
+				await asyncio.wait_for(stop_event.wait(), timeout=max(0, due_time - time.monotonic()))
+				break
+			except asyncio.TimeoutError:
+				pass
+			task_start = time.monotonic()
+			try:
+				data = await self.transaction(poll_funcs[task_name], device, self.device_states[device['slave_id']])
+			except Exception as poll_error:
+				# Ошибка одного устройства (ошибка обмена, ответ с кодом исключения ModBus) не останавливает опрос шины
+				print('Bus ', self.bus_name, ':: device ', device['name'], ':: ', task_name, ' error: ', repr(poll_error))
+				data = 0
+			task_stop = time.monotonic()
+			data_ok = not (isinstance(data, int) and 0 == data)
+			self._stats_update(device, task_name, task_start - due_time, task_stop - task_start, data_ok)
+			if True == data_ok and self.data_process is not None:
+				self.data_process(device['name'], task_name, data)
+			task[0] = max(due_time + period, task_stop)
+
+	def close(self):
+		'''
+		Brief Завершение потока шины (соединение остается в пуле до modbus_transport.transport_pool.close) \n
+		'''
+		self.executor.shutdown(wait=True)
+
+async def poll_run(buses, devices, data_process=None, run_time=POLLER_RUN_TIME, report_period=POLLER_REPORT_PERIOD, client_create=bus_client_create):
+	'''
+	Brief Опрос всех устройств: по одной сопрограмме на шину \n
+	Param[in] *buses* настройки шин (см. POLLER_BUSES) \n
+	Param[in] *devices* настройки устройств (см. POLLER_DEVICES) \n
+	Param[in] *data_process* функция обработки данных (имя устройства, имя задачи, данные) \n
+	Param[in] *run_time* время опроса [s] (None - до отмены) \n
+	Param[in] *report_period* период вывода статистики опроса [s] (None - не выводить) \n
+	Param[in] *client_create* функция создания клиента по настройкам шины \n
+	Return Статистика опроса по шинам: {имя шины: {(имя устройства, имя задачи): статистика}} \n
+	'''
+	loop = asyncio.get_running_loop()
+	bus_pollers = {}
+	for bus_name, bus_config in buses.items():
+		bus_devices = [device for device in devices if bus_name == device['bus']]
+		if len(bus_devices) > 0:
+			client = await loop.run_in_executor(None, client_create, bus_config)
+			bus_pollers[bus_name] = BusPoller(bus_name, client, bus_devices, data_process)
+	stop_event = asyncio.Event()
+
+	async def report_print():
+		while False == stop_event.is_set():
+			try:
+				await asyncio.wait_for(stop_event.wait(), timeout=report_period)
+			except asyncio.TimeoutError:
+				for bus_name, bus_poller in bus_pollers.items():
+					print('Bus ', bus_name, ':: ', bus_poller.stats)
+
+	poll_tasks = [asyncio.ensure_future(bus_poller.run(stop_event)) for bus_poller in bus_pollers.values()]
+	if report_period is not None:
+		poll_tasks.append(asyncio.ensure_future(report_print()))
+	try:
+		if run_time is not None:
+			await asyncio.sleep(run_time)
+		else:
+			await asyncio.gather(*poll_tasks)
+	finally:
+		stop_event.set()
+		await asyncio.gather(*poll_tasks, return_exceptions=True)
+		for bus_poller in bus_pollers.values():
+			await loop.run_in_executor(None, bus_poller.close)
+	return {bus_name: bus_poller.stats for bus_name, bus_poller in bus_pollers.items()}
+
+def main():
+	''' #MAIN
+	Brief Опрос устройств из POLLER_DEVICES на шинах POLLER_BUSES \n
+	'''
+	poll_stats = asyncio.run(poll_run(POLLER_BUSES, POLLER_DEVICES))
+	print('Poll stats: ', poll_stats)
+	print('Transport stats: ', modbus_transport.transport_pool.report())
+	modbus_transport.transport_pool.close()
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,73 @@
+'''
+## Проверка последовательности временных меток фреймов данных SD карты (общая для данных АЦП и диагностики)
+'''
+from datetime import datetime
+import numpy as np
+import fattime
+
+FRAME_PERIOD = 2 # [s] Интервал между метками времени соседних фреймов
+
+def check_time_sequence(frame_time, frame_period=FRAME_PERIOD):
+	'''
+	Brief Проверка последовательности временных меток всех фреймов файла за один вызов. \n
+	Метки переводятся в секунды, поэтому смена часа, суток, месяца и года учитывается \n
+	Param[in] *frame_time* массив меток времени FAT_TIME \n
+	Param[in] *frame_period* ожидаемый интервал между метками соседних фреймов, [s] \n
+	Return Словарь с результатами проверки: \n
+	*time_sequence* - True, если ошибок нет \n
+	*err_frames* - номера фреймов, метка которых не следует за меткой предыдущего фрейма \n
+	*gap_frames*, *gap_seconds* - фреймы после пропуска данных и длительность интервала до них, [s] \n
+	*duplicate_frames* - фреймы с той же меткой, что и у предыдущего \n
+	*backward_frames* - фреймы с меткой раньше предыдущей \n
+	'''
+	frame_seconds = fattime.convert_to_seconds_array(frame_time)
+	frame_step = np.diff(frame_seconds)
+	gap_steps = np.flatnonzero(frame_step > frame_period)
+	return {
+		'time_sequence': bool(np.all(frame_step == frame_period)),
+		'err_frames': (np.flatnonzero(frame_step != frame_period) + 1).tolist(),
+		'gap_frames': (gap_steps + 1).tolist(),
+		'gap_seconds': frame_step[gap_steps].tolist(),
+		'duplicate_frames': (np.flatnonzero(0 == frame_step) + 1).tolist(),
+		'backward_frames': (np.flatnonzero(frame_step < 0) + 1).tolist(),
+	}
+
+def find_time_gaps(time_start, frame_seconds, time_stop, frame_period=FRAME_PERIOD):
+	'''
+	Brief Поиск пропусков данных в интервале времени: начало и конец интервала без данных, \n
+	разрывы последовательности меток внутри интервала \n
+	Param[in] *time_start* начало интервала, секунды от 1970-01-01 \n
+	Param[in] *frame_seconds* метки времени фреймов внутри интервала, секунды от 1970-01-01 \n
+	Param[in] *time_stop* конец интервала (включительно), секунды от 1970-01-01 \n
+	Param[in] *frame_period* ожидаемый интервал между метками соседних фреймов, [s] \n
+	Return Список пропусков: номер фрейма после пропуска (относительно первого фрейма интервала), \n
+	начало и конец пропуска (datetime), длительность [s] \n
+	'''
+	edge_seconds = np.concatenate(([time_start], frame_seconds, [time_stop])).astype(np.int64)
+	gap_seconds = np.diff(edge_seconds)
+	# Граница интервала может не совпадать с меткой фрейма, допускается отклонение меньше периода
+	is_gap = gap_seconds > frame_period
+	is_gap[[0, -1]] = gap_seconds[[0, -1]] >= frame_period
+	edge_datetimes = edge_seconds.astype('datetime64[s]')
+	time_gaps = []
+	for edge_idx in np.flatnonzero(is_gap).tolist():
+		time_gaps.append({
+			'frame_idx': edge_idx,
+			'time_start': edge_datetimes[edge_idx].astype(datetime),
+			'time_stop': edge_datetimes[edge_idx + 1].astype(datetime),
+			'seconds': float(gap_seconds[edge_idx]),
+		})
+	return time_gaps
+
+def check_time_continuation(frame_time, previous_time=None, frame_period=FRAME_PERIOD):
+	'''
+	Brief Проверка последовательности меток новых фреймов с учетом метки последнего ранее проверенного фрейма \n
+	Param[in] *frame_time* массив меток времени FAT_TIME новых фреймов \n
+	Param[in] *previous_time* метка времени предыдущего фрейма FAT_TIME (None - новые фреймы с начала файла) \n
+	Param[in] *frame_period* ожидаемый интервал между метками соседних фреймов, [s] \n
+	Return Номера фреймов с ошибкой времени (относительно первого нового фрейма) \n
+	'''
+	if previous_time is None:
+		return check_time_sequence(frame_time, frame_period)['err_frames']
+	time_check = check_time_sequence(np.concatenate(([previous_time], frame_time)).astype(np.uint32), frame_period)
+	return [frame_idx - 1 for frame_idx in time_check['err_frames']]